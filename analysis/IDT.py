@@ -1,23 +1,68 @@
+from collections import deque
+
 import numpy as np
 
 from .consts import IDTConsts
+from .fixations import FixationArray, FixationBuffer
 
 
 def detect_fixations(
     points,
     idt_consts: IDTConsts,
-):
+    out: FixationBuffer | None = None,
+    cuts: np.ndarray | None = None,
+    starts: list[int] | None = None,
+) -> FixationArray:
+    """Fixations of the (elapsed_time_s, x, y) samples.
+
+    Every engine appends the fixations to `out` (a new buffer by default)
+    and returns a view of the ones it appended.
+    Windows never span the sample indexes in `cuts` (e.g. the trial starts of
+    a batch): the open window is dropped there, as at the end of the samples.
+    The index of the first sample of every fixation is appended to `starts`.
+    """
+    engine = idt_consts.ENGINE
+    if engine == "naive":
+        return detect_fixations_naive(points, idt_consts, out, cuts, starts)
+    if engine == "deque":
+        return detect_fixations_deque(points, idt_consts, out, cuts, starts)
+    if engine == "reach":
+        return detect_fixations_reach(points, idt_consts, out=out, cuts=cuts, starts=starts)
+    raise ValueError(f"Invalid engine: {engine}")
+
+
+def _segment_ends(n_points: int, cuts: np.ndarray | None) -> list[int]:
+    # end of every run of samples a window cannot span, the last one is n_points
+    if cuts is None:
+        return [n_points]
+    cuts = np.asarray(cuts)
+    return [*np.unique(cuts[(cuts > 0) & (cuts < n_points)]).tolist(), n_points]
+
+
+def detect_fixations_naive(
+    points,
+    idt_consts: IDTConsts,
+    out: FixationBuffer | None = None,
+    cuts: np.ndarray | None = None,
+    starts: list[int] | None = None,
+) -> FixationArray:
     T_disp = idt_consts.T_disp
     T_dur = idt_consts.T_dur
     # Initialize fixation data
-    fixations = []
+    fixations, first = _output_buffer(points, out)
     # initialize the moving window
     window_start = 0
     window_end = 0
     # data points
     n_points = len(points)
+    seg_ends = _segment_ends(n_points, cuts)
+    seg = 0
 
     while window_end < n_points:
+        if window_end == seg_ends[seg]:
+            # the window cannot span a cut, start over after it
+            seg += 1
+            window_start = window_end
         # calculate the moving window
         window_points = points[window_start : window_end + 1]
         x_max, x_min = np.max(window_points[:, 1]), np.min(window_points[:, 1])
@@ -41,17 +86,249 @@ def detect_fixations(
                     fixation_end - fixation_start
                 )  # calculate the fixation duration and change to ms
                 fixations.append(
-                    [
-                        centroid_x,
-                        centroid_y,
-                        fixation_start,
-                        fixation_end,
-                        fixation_duration,
-                    ]
+                    centroid_x,
+                    centroid_y,
+                    fixation_start,
+                    fixation_end,
+                    fixation_duration,
+                    dispersion,
                 )  # save the fixation datas
+                if starts is not None:
+                    starts.append(window_start)
                 window_start = window_end
         else:
             window_start += 1
             window_end = window_start
 
-    return fixations
+    return fixations.view()[first:]
+
+
+def _output_buffer(points, out: FixationBuffer | None) -> tuple[FixationBuffer, int]:
+    # the buffer to append to and the index of the first new fixation
+    if out is None:
+        # room for one fixation every 8 samples before the buffer grows
+        out = FixationBuffer(len(points) // 8 + 1)
+    return out, len(out)
+
+
+def _push(window: deque, values: np.ndarray, idx: int, is_max: bool) -> None:
+    # keep the values in the window monotonic so that window[0] is the extremum
+    value = values[idx]
+    if is_max:
+        while window and values[window[-1]] <= value:
+            window.pop()
+    else:
+        while window and values[window[-1]] >= value:
+            window.pop()
+    window.append(idx)
+
+
+def detect_fixations_deque(
+    points,
+    idt_consts: IDTConsts,
+    out: FixationBuffer | None = None,
+    cuts: np.ndarray | None = None,
+    starts: list[int] | None = None,
+) -> FixationArray:
+    """I-DT with the window extrema tracked by monotonic deques.
+
+    Gives the same fixations as `detect_fixations_naive` in O(n).
+    When the dispersion threshold is exceeded, the naive engine restarts the
+    window at `window_start + 1` and regrows it up to the current end.
+    All the samples it regrows over already passed both thresholds with an
+    earlier start, so this engine only drops the first sample and keeps going.
+    """
+    T_disp = idt_consts.T_disp
+    T_dur = idt_consts.T_dur
+    times = points[:, 0]
+    xs = points[:, 1]
+    ys = points[:, 2]
+
+    fixations, first = _output_buffer(points, out)
+    window_start = 0
+    window_end = 0
+    n_points = len(points)
+    # indexes of the window samples whose values are monotonic
+    x_max_q: deque = deque()
+    x_min_q: deque = deque()
+    y_max_q: deque = deque()
+    y_min_q: deque = deque()
+    queues = ((x_max_q, xs, True), (x_min_q, xs, False), (y_max_q, ys, True), (y_min_q, ys, False))
+    pushed = -1  # the last index pushed into the queues
+    seg_ends = _segment_ends(n_points, cuts)
+    seg = 0
+
+    while window_end < n_points:
+        if window_end == seg_ends[seg]:
+            # the window cannot span a cut, start over after it
+            seg += 1
+            window_start = window_end
+            for q, _, _ in queues:
+                q.clear()
+        if pushed < window_end:
+            for q, values, is_max in queues:
+                _push(q, values, window_end, is_max)
+            pushed = window_end
+        for q, _, _ in queues:
+            while q[0] < window_start:
+                q.popleft()
+
+        dispersion = (xs[x_max_q[0]] - xs[x_min_q[0]]) + (ys[y_max_q[0]] - ys[y_min_q[0]])
+
+        if dispersion <= T_disp:
+            duration = times[window_end] - times[window_start]
+            if duration <= T_dur:
+                window_end += 1
+            else:
+                centroid_x = np.mean(xs[window_start : window_end + 1])
+                centroid_y = np.mean(ys[window_start : window_end + 1])
+                fixation_start = times[window_start]
+                fixation_end = times[window_end - 1]
+                fixation_duration = fixation_end - fixation_start
+                fixations.append(
+                    centroid_x,
+                    centroid_y,
+                    fixation_start,
+                    fixation_end,
+                    fixation_duration,
+                    dispersion,
+                )
+                if starts is not None:
+                    starts.append(window_start)
+                window_start = window_end
+        else:
+            window_start += 1
+            window_end = max(window_end, window_start)
+
+    return fixations.view()[first:]
+
+
+def dispersion_reach(points, t_disp: float, cuts: np.ndarray | None = None) -> np.ndarray:
+    """Last index `reach[s]` such that the window [s, reach[s]] has a dispersion
+    within `t_disp` (`s - 1` if even a single sample does not).
+
+    It does not depend on the duration threshold, so it can be shared by every
+    `T_dur` value of a sweep. Windows stop before the next of the `cuts`.
+    """
+    xs = points[:, 1]
+    ys = points[:, 2]
+    n_points = len(points)
+    reach = np.empty(n_points, dtype=np.int64)
+    x_max_q: deque = deque()
+    x_min_q: deque = deque()
+    y_max_q: deque = deque()
+    y_min_q: deque = deque()
+    queues = ((x_max_q, xs, True), (x_min_q, xs, False), (y_max_q, ys, True), (y_min_q, ys, False))
+
+    end = 0  # the first index that failed with an earlier start
+    pushed = -1  # the last index pushed into the queues
+    seg_ends = _segment_ends(n_points, cuts)
+    seg = 0
+    for start in range(n_points):
+        if start == seg_ends[seg]:
+            seg += 1
+        end = max(end, start)
+        while end < seg_ends[seg]:
+            if pushed < end:
+                for q, values, is_max in queues:
+                    _push(q, values, end, is_max)
+                pushed = end
+            for q, _, _ in queues:
+                while q[0] < start:
+                    q.popleft()
+            dispersion = (xs[x_max_q[0]] - xs[x_min_q[0]]) + (ys[y_max_q[0]] - ys[y_min_q[0]])
+            if not dispersion <= t_disp:
+                break
+            end += 1
+        reach[start] = end - 1
+    return reach
+
+
+def duration_reach(times: np.ndarray, t_dur: float, cuts: np.ndarray | None = None) -> np.ndarray:
+    """First index `k` such that `times[k] - times[s] > t_dur` for every start s.
+
+    With `cuts`, `k` is at most the next cut; the times only need to be sorted
+    between two cuts, so every run is searched on its own.
+    """
+    if cuts is not None:
+        ends = []
+        lo = 0
+        for hi in _segment_ends(len(times), cuts):
+            ends.append(lo + duration_reach(times[lo:hi], t_dur))
+            lo = hi
+        return np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+    n_points = len(times)
+    starts = np.arange(n_points)
+    ends = np.searchsorted(times, times + t_dur, side="right")
+    # align with the exact test of the detector, which may round differently
+    while True:
+        back = (ends > starts) & (times[np.maximum(ends - 1, 0)] - times > t_dur)
+        forward = (ends < n_points) & (times[np.minimum(ends, n_points - 1)] - times <= t_dur)
+        if not (back.any() or forward.any()):
+            return ends
+        ends = ends - back + forward
+
+
+def detect_fixations_reach(
+    points,
+    idt_consts: IDTConsts,
+    reach: np.ndarray | None = None,
+    out: FixationBuffer | None = None,
+    cuts: np.ndarray | None = None,
+    starts: list[int] | None = None,
+) -> FixationArray:
+    """I-DT driven by precomputed dispersion reaches.
+
+    Gives the same fixations as `detect_fixations_naive`. Passing the
+    `reach` of `dispersion_reach(points, idt_consts.T_disp, cuts)` skips its
+    computation, e.g. when sweeping `T_dur`.
+    """
+    times = points[:, 0]
+    xs = points[:, 1]
+    ys = points[:, 2]
+    if reach is None:
+        reach = dispersion_reach(points, idt_consts.T_disp, cuts)
+    dur_end = duration_reach(times, idt_consts.T_dur, cuts)
+
+    fixations, first = _output_buffer(points, out)
+    n_points = len(points)
+    seg_ends = _segment_ends(n_points, cuts)
+    seg = 0
+    window_start = 0
+    while window_start < n_points:
+        while window_start >= seg_ends[seg]:
+            seg += 1
+        # the window grows until the dispersion or the duration test fails
+        disp_fail = reach[window_start] + 1
+        dur_fail = dur_end[window_start]
+        if min(disp_fail, dur_fail) >= seg_ends[seg]:
+            # the window is still open at the cut, start over after it
+            window_start = seg_ends[seg]
+            continue
+        if disp_fail <= dur_fail:
+            # skip the starts whose window still fails at the same end
+            window_start = max(
+                window_start + 1, int(np.searchsorted(reach, disp_fail, side="left"))
+            )
+        else:
+            window_end = dur_fail
+            window_xs = xs[window_start : window_end + 1]
+            window_ys = ys[window_start : window_end + 1]
+            centroid_x = np.mean(window_xs)
+            centroid_y = np.mean(window_ys)
+            fixation_start = times[window_start]
+            fixation_end = times[window_end - 1]
+            fixation_duration = fixation_end - fixation_start
+            dispersion = np.ptp(window_xs) + np.ptp(window_ys)
+            fixations.append(
+                centroid_x,
+                centroid_y,
+                fixation_start,
+                fixation_end,
+                fixation_duration,
+                dispersion,
+            )
+            if starts is not None:
+                starts.append(window_start)
+            window_start = window_end
+    return fixations.view()[first:]
@@ -1,21 +1,22 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
 from .consts import SCREEN_HEIGHT, SCREEN_WIDTH, SMTConsts
+from .fixations import FixationArray, aggregate_runs
 
-
-# Utility code for plotting
-def in_range(x, start, end):
-    return x >= start and x <= end
+# label categories of `detect_fixations`, indexed by the label codes
+LABELS = ("fixation", "saccade")
 
 
+# Utility code for plotting
 def pairwise(iterable):
     a = iter(iterable)
     return zip(a, a)
 
 
 def plot_middle(velocity, plot_data, threshold):
+    import matplotlib.pyplot as plt  # noqa: PLC0415
+
     data_x, data_y, out_x, out_y, threshold_lim, lines, centers = plot_data
     fig, ax = plt.subplots()
     ax.plot(velocity, "-o", alpha=0.8)
@@ -48,61 +49,86 @@ def calc_euc_velocity(df: pd.DataFrame):
 
 
 # Calculate angular velocity
-def calc_vel(df: pd.DataFrame, dist_eye2disp, use_ang_velo=True, plot=False):
+def calc_vel(
+    df: pd.DataFrame,
+    dist_eye2disp,
+    use_ang_velo=True,
+    plot=False,
+    out: np.ndarray | None = None,
+):
     if use_ang_velo:
-        velocity = calc_angular_velocity(df, dist_eye2disp)
+        velocity = calc_angular_velocity(df, dist_eye2disp, out=out)
     else:
         velocity = calc_euc_velocity(df)
+        if out is not None:
+            out[...] = velocity
+            velocity = out
 
     if plot:
+        import matplotlib.pyplot as plt  # noqa: PLC0415
+
         plt.plot(range(0, len(velocity)), velocity)
     return velocity
 
 
-def calc_angular_velocity(df: pd.DataFrame, dist_eye2disp):
+def calc_angular_velocity(df: pd.DataFrame, dist_eye2disp, out: np.ndarray | None = None):
     xs = df["x"].to_numpy()
     ys = df["y"].to_numpy()
     times = df["elapsed_time_s"].to_numpy()
-
+    return angular_velocity(xs, ys, times, dist_eye2disp, out=out)
+
+
+def angular_velocity(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    times: np.ndarray,
+    dist_eye2disp: float,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Angular velocity (rad/s) of the eye between consecutive samples.
+
+    The eye is assumed to look at the display from `dist_eye2disp`, and the
+    angle between the gaze vectors a and b of two samples is
+    arctan2(|a x b|, a . b), which unlike arccos stays accurate for the
+    small angles between samples. The result is written to `out` if given
+    (e.g. a float32 buffer of n - 1 values), the arithmetic is in float64.
+    """
     # assume eye position(x,y) is on the center of the display
-    centerOfDisp_x = SCREEN_HEIGHT / 2
-    centerOfDisp_y = SCREEN_WIDTH / 2
-    # Conver coordination from that top left of the display is (0,0)
-    #  to that center of the display is (0,0,dist_eye2disp)
-    converted_xs = xs + centerOfDisp_x
-    converted_ys = ys + centerOfDisp_y
-    converted_zs = np.zeros(len(converted_xs))
-    converted_zs[:] = dist_eye2disp
-    shift_xs = converted_xs[1:]
-    shift_ys = converted_ys[1:]
-    shift_zs = converted_zs[1:]
-    shift_times = times[1:]
-
-    # theta = arccos{innerProduct(vector_a, vector_b) / |a||b|}
-    dist_a = np.sqrt(
-        (converted_xs[:-1]) ** 2 + (converted_ys[:-1]) ** 2 + (converted_zs[:-1]) ** 2
-    )  # |a|
-    dist_b = np.sqrt((shift_xs) ** 2 + (shift_ys) ** 2 + (shift_zs) ** 2)  # |b|
-    # innerProduct of vector_a and vector_b
-    innerProduct_ab = np.sum(
-        np.array(
-            [
-                converted_xs[:-1] * shift_xs,
-                converted_ys[:-1] * shift_ys,
-                converted_zs[:-1] * shift_zs,
-            ]
-        ).T,
-        axis=1,
-    )
-    deltaTheta = np.arccos(innerProduct_ab / (dist_a * dist_b))  # theta
-    deltaTime = shift_times - times[:-1]
-    velocity = deltaTheta / deltaTime
-    return velocity
-
-
-def grouping_sac_cand(velocity, threshold):
-    # funtion that detect saccade candidate according to threshold
-
+    # (x is shifted by half of the height, kept to match the existing results)
+    gx = np.add(xs, SCREEN_HEIGHT / 2, dtype=np.float64)
+    gy = np.add(ys, SCREEN_WIDTH / 2, dtype=np.float64)
+    ax, bx = gx[:-1], gx[1:]
+    ay, by = gy[:-1], gy[1:]
+    z2 = dist_eye2disp * dist_eye2disp
+
+    # a = (ax, ay, z) and b = (bx, by, z), in place to keep few temporaries
+    dot = ax * bx
+    tmp = ay * by
+    dot += tmp
+    dot += z2
+    # |a x b|^2 = z^2 ((bx - ax)^2 + (by - ay)^2) + (ax by - ay bx)^2
+    cross = np.subtract(bx, ax)
+    cross *= cross
+    np.subtract(by, ay, out=tmp)
+    tmp *= tmp
+    cross += tmp
+    cross *= z2
+    np.multiply(ax, by, out=tmp)
+    tmp -= ay * bx
+    tmp *= tmp
+    cross += tmp
+    np.sqrt(cross, out=cross)
+
+    velocity = np.arctan2(cross, dot, out=cross)
+    velocity /= np.diff(times)
+    if out is None:
+        return velocity
+    out[...] = velocity
+    return out
+
+
+def sac_cand_arrays(velocity: np.ndarray, threshold: float) -> tuple[np.ndarray, np.ndarray]:
+    """First index and length of every run of velocities over `threshold`."""
     suc_or_other = velocity > threshold
     # Detect indexes that the value switch
     switch_indices = np.where(suc_or_other[:-1] != suc_or_other[1:])[0] + 1
@@ -113,67 +139,90 @@ def grouping_sac_cand(velocity, threshold):
 
     group_lengths = np.diff(np.append(group_start_indices, len(suc_or_other)))
     suc_cand_lengths = group_lengths[suc_or_other[group_start_indices]]
+    return suc_start_indices, suc_cand_lengths
 
-    # handle saccade information with zipping
-    sac_cand_info = zip(suc_start_indices, suc_cand_lengths)
-    return sac_cand_info
+
+def grouping_sac_cand(velocity, threshold):
+    # funtion that detect saccade candidate according to threshold
+    # (start, length) pairs of `sac_cand_arrays`, kept for compatibility
+    return zip(*sac_cand_arrays(velocity, threshold))
 
 
-def gen_sac_cand(sac_cand_info, eye_vel, width):
+def gen_sac_cand(sac_cand_info, eye_vel, width, plot=False):
     # function that generate saccade candidate with width parameter
+    # `sac_cand_info` is the (starts, lengths) of `sac_cand_arrays`, or
+    # (start, length) pairs as `grouping_sac_cand` gives
+    if isinstance(sac_cand_info, tuple) and isinstance(sac_cand_info[0], np.ndarray):
+        starts, lengths = (np.asarray(a, dtype=np.int64) for a in sac_cand_info)
+    else:
+        pairs = np.asarray(list(sac_cand_info), dtype=np.int64).reshape(-1, 2)
+        starts, lengths = pairs[:, 0], pairs[:, 1]
+    lengths = lengths - 1
+    keep = lengths >= 1
+    starts = starts[keep]
+    lengths = lengths[keep]
+
+    if len(starts) == 0:
+        peaks = np.empty(0, dtype=np.asarray(eye_vel).dtype)
+        max_indices = np.empty(0, dtype=np.int64)
+    else:
+        # peak of every candidate period in one pass; candidates are separated by
+        # at least one sample under the threshold, so the bounds are increasing
+        bounds = np.column_stack([starts, starts + lengths]).ravel()
+        peaks = np.maximum.reduceat(eye_vel, bounds)[::2]
+        # first index of the peak in every candidate period (same as np.argmax)
+        seg_ids = np.repeat(np.arange(len(starts)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        sample_idx = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+        is_peak = np.flatnonzero(eye_vel[sample_idx] == peaks[seg_ids])
+        _, first = np.unique(seg_ids[is_peak], return_index=True)
+        max_indices = sample_idx[is_peak[first]]
+
+    # center of saccade(candidate) period
+    centers = starts + lengths / 2
+    # Consider the candidates as real saccades if their peak is
+    # within the saccade peak width from the center of the candidates.
+    is_sac = (max_indices >= centers - width) & (max_indices <= centers + width)
+
+    # (start, length) rows
+    sac_cands = np.column_stack([starts[is_sac], lengths[is_sac]])
+    non_saccade = np.column_stack([starts[~is_sac], lengths[~is_sac]])
+
+    # data for plot
+    plot_data = None
+    if plot:
+        plot_data = (
+            max_indices[is_sac].tolist(),
+            peaks[is_sac].tolist(),
+            max_indices[~is_sac].tolist(),
+            peaks[~is_sac].tolist(),
+            np.column_stack([starts, starts + lengths]).ravel().tolist(),
+            np.column_stack([centers - width, centers + width]).ravel().tolist(),
+            centers.tolist(),
+        )
+    return (sac_cands, non_saccade), plot_data
 
-    # important things for process
-    sac_cands = []
-    non_saccade = []
-
-    # not important so much, just for plot
-    data_x = []
-    data_y = []
-    out_x = []
-    out_y = []
-    threshold_lim = []
-    lines = []
-    centers = []
-
-    for start, length in sac_cand_info:
-        start = int(start)
-        length = int(length)
-        length -= 1
-        if length < 1:
-            continue
-        sac_cand = eye_vel[start : start + length]
-        max_index = start + np.argmax(sac_cand)
-
-        # center of saccade(candidate) period
-        center = start + length / 2
-        # Detect peaks over the fixation velocity threshold as candidates of saccades
-        peak = np.max(sac_cand)
-        #
-        cand_range = (center - width, center + width)
-
-        # Consider the candidates as real saccades if their peak is
-        # within the saccade peak width from the center of the candidates.
-        if in_range(max_index, *cand_range):
-            sac_cands.append((start, length))
-        else:
-            non_saccade.append((start, length))
-
-        # data for plot
-        lines.append(cand_range[0])
-        lines.append(cand_range[1])
-        threshold_lim.append(start)
-        threshold_lim.append(start + length)
-        centers.append(center)
-        if in_range(max_index, *cand_range):
-            data_x.append(max_index)
-            data_y.append(peak)
-        else:
-            out_x.append(max_index)
-            out_y.append(peak)
-    return (
-        (sac_cands, non_saccade),
-        (data_x, data_y, out_x, out_y, threshold_lim, lines, centers),
-    )
+
+def label_saccades(times: np.ndarray, sac_cands) -> np.ndarray:
+    """Paint every saccade period onto one uint8 label array.
+
+    Each saccade `(start, length)` covers the samples whose time is within
+    `[times[start], times[start + length]]`. The intervals are painted with a
+    difference array, so the cost is linear in the number of samples.
+    Returns codes into `LABELS` (0: fixation, 1: saccade).
+    """
+    n_samples = len(times)
+    if len(sac_cands) == 0:
+        return np.zeros(n_samples, dtype=np.uint8)
+    starts, lengths = np.asarray(sac_cands, dtype=np.int64).T
+    # times are monotonic, so the time bounds map to index bounds
+    lo = np.searchsorted(times, times[starts], side="left")
+    hi = np.searchsorted(times, times[starts + lengths], side="right")
+
+    diff = np.zeros(n_samples + 1, dtype=np.int32)
+    np.add.at(diff, lo, 1)
+    np.add.at(diff, hi, -1)
+    return (np.cumsum(diff[:-1]) > 0).astype(np.uint8)
 
 
 # classify data period
@@ -181,51 +230,55 @@ def detect_fixations(
     df: pd.DataFrame,
     smt_consts: SMTConsts,
     plot: bool = False,
+    velocity: np.ndarray | None = None,
 ) -> pd.DataFrame:
     threshold = smt_consts.THRESHOLD
     width = smt_consts.WIDTH
     dist_eye2disp = smt_consts.DIST_EYE2DISP
     use_ang_velo = smt_consts.USE_ANG_VELO
-    # calculate angular velocity
-    velocity = calc_vel(df, dist_eye2disp, use_ang_velo, plot)
+    # calculate angular velocity, unless it is given (e.g. cached)
+    if velocity is None:
+        velocity = calc_vel(df, dist_eye2disp, use_ang_velo, plot)
     # get saccade candidate
-    sac_cand_info = grouping_sac_cand(velocity, threshold)
-    ((sac_cands, _non_saccade), plot_data) = gen_sac_cand(sac_cand_info, velocity, width)
+    sac_cand_info = sac_cand_arrays(velocity, threshold)
+    ((sac_cands, _non_saccade), plot_data) = gen_sac_cand(
+        sac_cand_info, velocity, width, plot=plot
+    )
 
     # package it to DataFrame
     df_result = df.copy()
     times = df_result["elapsed_time_s"].to_numpy()
-    df_result["label"] = "fixation"
-    for start_sac, length in sac_cands:
-        start_time = times[start_sac]
-        end_time = times[start_sac + length]
-        start = df_result["elapsed_time_s"] >= start_time
-        end = df_result["elapsed_time_s"] <= end_time
-        df_result.loc[start & end, "label"] = "saccade"
+    label_codes = label_saccades(times, sac_cands)
+    df_result["label"] = pd.Categorical.from_codes(label_codes, categories=LABELS)
 
     if plot:
         plot_middle(velocity, plot_data, threshold)
     return df_result
 
 
-def convert_data_into_fixations(df_org: pd.DataFrame) -> pd.DataFrame:
-    df = df_org.copy()
-    df = df.reset_index()
-
-    labels = (df["label"] == "fixation").to_numpy()
-    switch_indices = np.where(labels[:-1] != labels[1:])[0] + 1
-    # Get head indexes of the each group
-    group_start_indices = np.insert(switch_indices, 0, 0)
-    # head of saccade
-    fix_start_indices = group_start_indices[labels[group_start_indices]]
-
-    group_lengths = np.diff(np.append(group_start_indices, len(labels)))
-
-    fix_duration = group_lengths[labels[group_start_indices]]
-    fixation_df = df.loc[fix_start_indices, ["x", "y"]].copy()
-    fixation_df["duration"] = fix_duration
-
-    return fixation_df
+def fixation_runs(is_fix: np.ndarray, cuts: np.ndarray | None = None) -> np.ndarray:
+    """First index of every run of equal labels, runs also start at `cuts`."""
+    n_points = len(is_fix)
+    heads = np.zeros(n_points, dtype=bool)
+    if n_points:
+        heads[0] = True
+        heads[1:] = is_fix[1:] != is_fix[:-1]
+        if cuts is not None:
+            heads[cuts[cuts < n_points]] = True
+    return np.flatnonzero(heads)
+
+
+def convert_data_into_fixations(df: pd.DataFrame) -> FixationArray:
+    """Fixations of the samples labelled by `detect_fixations`.
+
+    Every run of "fixation" samples gives one fixation with the centroid,
+    times, duration (seconds) and dispersion of its samples, the same
+    record as I-DT.
+    """
+    points = df[["elapsed_time_s", "x", "y"]].to_numpy(dtype=np.float64)
+    is_fix = (df["label"] == "fixation").to_numpy()
+    run_starts = fixation_runs(is_fix)
+    return aggregate_runs(points, run_starts)[is_fix[run_starts]]
 
 
 """
@@ -1,25 +1,43 @@
-from . import io, utils
+from . import heatmap, io, profiling, stream, utils
+from .batch import SampleBatch
+from .cohort import run_cohort
 from .consts import IDTConsts, SMTConsts
+from .export import export_mfd
+from .fixations import FixationArray
 from .io import load_data
-from .logger_config import logger
-from .metrics import calculate_metrics
+from .logger_config import logger, setup_file_logging
+from .metrics import batch_metrics, calculate_metrics
 from .postprocess import (
     calc_mean_nb_of_fixes_for_time_window_all_trial,
     calc_transitions_trial,
+    calc_window_metrics,
 )
 from .preprocess import preprocess
 from .subject import Subject
+from .sweep import sweep_idt, sweep_smt
 
 __all__ = [
+    "heatmap",
     "io",
+    "profiling",
+    "stream",
     "utils",
     "IDTConsts",
     "SMTConsts",
+    "SampleBatch",
+    "FixationArray",
     "Subject",
+    "batch_metrics",
     "calculate_metrics",
     "load_data",
     "logger",
+    "setup_file_logging",
     "preprocess",
     "calc_mean_nb_of_fixes_for_time_window_all_trial",
     "calc_transitions_trial",
+    "calc_window_metrics",
+    "run_cohort",
+    "export_mfd",
+    "sweep_idt",
+    "sweep_smt",
 ]
@@ -0,0 +1,25 @@
+import importlib
+import sys
+
+from .logger_config import setup_file_logging
+
+# command -> module with a `main(argv)`, imported only when it runs
+COMMANDS = {
+    "export": "export",
+    "figures": "figures",
+    "store": "store",
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: python -m analysis {{{','.join(COMMANDS)}}} ...")
+        sys.exit(2)
+    setup_file_logging()
+    module = importlib.import_module(f".{COMMANDS[argv[0]]}", __package__)
+    module.main(argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from .consts import MASK_IMAGE_PATH
+
+# colors of the areas of interest in the mask image
+AOI_COLORS: dict[str, tuple[int, int, int]] = {
+    "timer": (255, 0, 0),
+    "left": (0, 255, 0),
+    "right": (0, 0, 255),
+}
+
+BBox = tuple[tuple[int, int], tuple[int, int]]
+
+
+def make_mask(mask: np.ndarray, color: tuple[int, int, int]) -> np.ndarray:
+    return (
+        (mask[..., 0] == color[0])
+        & (mask[..., 1] == color[1])
+        & (mask[..., 2] == color[2])
+    )
+
+
+class AOIIndex:
+    """Label raster of the areas of interest.
+
+    Label 0 is outside of every AOI, and the AOIs are labelled from 1 in the
+    order of `colors`. Fixations are classified by direct pixel lookup, so
+    AOIs of any shape are supported exactly.
+    """
+
+    def __init__(
+        self,
+        mask: np.ndarray,
+        colors: dict[str, tuple[int, int, int]] = AOI_COLORS,
+    ) -> None:
+        self.names = ["other", *colors]
+        self.raster = np.zeros(mask.shape[:2], dtype=np.uint8)
+        self.bboxes: dict[str, BBox] = {}
+        for label, (name, color) in enumerate(colors.items(), start=1):
+            region = make_mask(mask, color)
+            self.raster[region] = label
+            y, x = np.where(region)
+            self.bboxes[name] = ((x.min(), x.max()), (y.min(), y.max()))
+
+    @classmethod
+    def from_image(cls, path: Path = MASK_IMAGE_PATH) -> "AOIIndex":
+        from PIL import Image  # noqa: PLC0415
+
+        mask = np.array(Image.open(path))[..., :3]
+        return cls(mask)
+
+    def label_of(self, name: str) -> int:
+        return self.names.index(name)
+
+    def classify(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """AOI label of every (x, y) pixel coordinate.
+
+        A point between pixels is inside an AOI only if all the pixels around
+        it are, which matches the closed bounding-box test for rectangles.
+        """
+        height, width = self.raster.shape
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        inside = (x >= 0) & (x <= width - 1) & (y >= 0) & (y <= height - 1)
+        x = x[inside]
+        y = y[inside]
+        cols = (np.floor(x).astype(np.intp), np.ceil(x).astype(np.intp))
+        rows = (np.floor(y).astype(np.intp), np.ceil(y).astype(np.intp))
+
+        found = self.raster[rows[0], cols[0]]
+        for row, col in ((rows[0], cols[1]), (rows[1], cols[0]), (rows[1], cols[1])):
+            found = np.where(self.raster[row, col] == found, found, 0)
+
+        labels = np.zeros(inside.shape, dtype=np.uint8)
+        labels[inside] = found
+        return labels
+
+
+@lru_cache(maxsize=None)
+def get_aoi_index(path: Path = MASK_IMAGE_PATH) -> AOIIndex:
+    # the mask is decoded once per process
+    return AOIIndex.from_image(path)
@@ -0,0 +1,151 @@
+from collections.abc import Hashable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .consts import IDTConsts, SMTConsts
+from .fixations import FixationArray, aggregate_runs
+from .IDT import detect_fixations
+from .metrics import segment_metrics
+from .SMT import (
+    LABELS,
+    calc_vel,
+    fixation_runs,
+    gen_sac_cand,
+    label_saccades,
+    sac_cand_arrays,
+)
+
+
+class SampleBatch:
+    """Preprocessed samples of several trials in one buffer.
+
+    The samples of trial k are `points[offsets[k] : offsets[k + 1]]`, as
+    (elapsed_time_s, x, y) rows. `keys` names every trial, e.g. (root, trial_num).
+    """
+
+    def __init__(self, points: np.ndarray, offsets: np.ndarray, keys: list[Hashable]) -> None:
+        self.points = points
+        self.offsets = offsets
+        self.keys = keys
+
+    @classmethod
+    def concat(cls, points: Sequence[np.ndarray], keys: Sequence[Hashable]) -> "SampleBatch":
+        lengths = [len(trial_points) for trial_points in points]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        if len(points):
+            buffer = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 3) for p in points])
+        else:
+            buffer = np.empty((0, 3))
+        return cls(buffer, offsets, list(keys))
+
+    @classmethod
+    def from_subjects(cls, subjects, trials: Sequence[int] | None = None) -> "SampleBatch":
+        """Every trial (or the given ones) of every subject, keyed by (root, trial_num)."""
+        points = []
+        keys = []
+        for subj in subjects:
+            for trial_num in subj.all_trials if trials is None else trials:
+                points.append(subj.trial_points(trial_num))
+                keys.append((subj.root, trial_num))
+        return cls.concat(points, keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def trial(self, i: int) -> np.ndarray:
+        return self.points[self.offsets[i] : self.offsets[i + 1]]
+
+    def segment_ids(self) -> np.ndarray:
+        """The trial of every sample."""
+        return np.repeat(np.arange(len(self.keys)), np.diff(self.offsets))
+
+
+class RaggedFixations:
+    """Fixations of several trials, those of trial k at `offsets[k] : offsets[k + 1]`.
+
+    `fixations` is a FixationArray (or a DataFrame), and indexing by trial
+    returns a slice of it without copying.
+    """
+
+    def __init__(
+        self,
+        fixations: FixationArray | pd.DataFrame,
+        offsets: np.ndarray,
+        keys: list[Hashable],
+    ) -> None:
+        self.fixations = fixations
+        self.offsets = offsets
+        self.keys = keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __getitem__(self, i: int) -> FixationArray | pd.DataFrame:
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        if isinstance(self.fixations, pd.DataFrame):
+            return self.fixations.iloc[lo:hi]
+        return self.fixations[lo:hi]
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def get(self, key: Hashable) -> FixationArray | pd.DataFrame:
+        return self[self.keys.index(key)]
+
+    def metrics(self, names: Sequence[str] | None = None) -> pd.DataFrame:
+        """`metrics.segment_metrics` of every trial, indexed by the keys."""
+        metrics_df = segment_metrics(self.fixations, self.offsets, names)
+        metrics_df.index = pd.Index(self.keys)
+        return metrics_df
+
+
+def detect_fixations_idt_batch(batch: SampleBatch, idt_consts: IDTConsts) -> RaggedFixations:
+    """I-DT over every trial of the batch in one pass over its buffer.
+
+    The windows are cut at every trial start, so the fixations of each trial
+    are those of `detect_fixations` on its own samples.
+    """
+    starts = []
+    fixations = detect_fixations(batch.points, idt_consts, cuts=batch.offsets[:-1], starts=starts)
+    offsets = np.searchsorted(np.array(starts, dtype=np.int64), batch.offsets, side="left")
+    return RaggedFixations(fixations, offsets.astype(np.int64), batch.keys)
+
+
+def label_saccades_batch(batch: SampleBatch, smt_consts: SMTConsts) -> np.ndarray:
+    """SMT label codes (into `SMT.LABELS`) of every sample of the batch.
+
+    The velocity, the saccade candidates and the labels are computed over the
+    whole buffer at once. The velocity between two trials is set to NaN so
+    no candidate spans two trials.
+    """
+    points = batch.points
+    n_points = len(points)
+    if n_points < 2:
+        return np.zeros(n_points, dtype=np.uint8)
+    df = pd.DataFrame(points, columns=["elapsed_time_s", "x", "y"])
+    velocity = calc_vel(df, smt_consts.DIST_EYE2DISP, smt_consts.USE_ANG_VELO)
+    # velocity[i] goes from sample i to i + 1
+    boundaries = batch.offsets[1:-1]
+    boundaries = boundaries[(boundaries > 0) & (boundaries < n_points)]
+    velocity[boundaries - 1] = np.nan
+
+    sac_cand_info = sac_cand_arrays(velocity, smt_consts.THRESHOLD)
+    ((sac_cands, _non_saccade), _) = gen_sac_cand(sac_cand_info, velocity, smt_consts.WIDTH)
+
+    # elapsed times restart at every trial, shift them so they keep increasing
+    times = points[:, 0]
+    span = np.ceil(times.max() - times.min()) + 1
+    times = times + batch.segment_ids() * span
+    return label_saccades(times, sac_cands)
+
+
+def detect_fixations_smt_batch(batch: SampleBatch, smt_consts: SMTConsts) -> RaggedFixations:
+    """SMT fixations of every trial of the batch, those of `SMT.convert_data_into_fixations`."""
+    is_fix = label_saccades_batch(batch, smt_consts) == LABELS.index("fixation")
+    # runs of labels, cut at every trial start
+    run_starts = fixation_runs(is_fix, cuts=batch.offsets[:-1])
+    fix_starts = run_starts[is_fix[run_starts]]
+    fixations = aggregate_runs(batch.points, run_starts)[is_fix[run_starts]]
+    offsets = np.searchsorted(fix_starts, batch.offsets, side="left").astype(np.int64)
+    return RaggedFixations(fixations, offsets, batch.keys)
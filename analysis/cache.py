@@ -0,0 +1,80 @@
+import sys
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+def nbytes_of(value: Any) -> int:
+    """Approximate in-memory size of a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray) or hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._items:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items.move_to_end(key)
+        return self._items[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = nbytes_of(value)
+        self.invalidate(key)
+        if size > self.max_bytes:
+            # never cache values that do not fit at all
+            return
+        self._items[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.nbytes -= evicted_size
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._items:
+            _, size = self._items.pop(key)
+            self.nbytes -= size
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        for key in [key for key in self._items if predicate(key)]:
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._items),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def __repr__(self) -> str:
+        return f"LRUCache(items={len(self._items)}, nbytes={self.nbytes}, max_bytes={self.max_bytes}, hits={self.hits}, misses={self.misses})"
@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .consts import IDTConsts, SMTConsts
+from .io import load_path
+from .logger_config import logger
+from .metrics import METRIC_COLUMNS, calculate_metrics
+from .profiling import PROFILER, run_profiled
+from .store import ResultStore
+from .subject import AlgoType, Subject
+
+# one job: (subject root, group, trial number, algorithm)
+Job = tuple[Path, str, int, AlgoType]
+# integer columns, nullable since failed jobs have no value
+INT_COLUMNS = ["task_id", "Total Number of Fixations"]
+
+
+def cohort_jobs(
+    results_root: Path,
+    trials: list[int] | None = None,
+    algorithms: tuple[AlgoType, ...] = ("IDT", "SMT"),
+) -> list[Job]:
+    """List subject x trial x algorithm jobs in a deterministic order."""
+    timer_subj_roots, control_subj_roots = load_path(results_root)
+    jobs = []
+    for group, roots in (("timer", timer_subj_roots), ("control", control_subj_roots)):
+        for root in roots:
+            for trial_num in trials if trials is not None else [0, 1, 2, 3, 4]:
+                jobs.extend((root, group, trial_num, algo) for algo in algorithms)
+    return jobs
+
+
+def run_job(
+    job: Job,
+    idt_consts: IDTConsts,
+    smt_consts: SMTConsts,
+    result_store: ResultStore | None = None,
+) -> dict:
+    """Detect the fixations of one trial and compute its metrics.
+
+    Errors are returned in the "error" column instead of being raised.
+    """
+    root, group, trial_num, algo = job
+    row = {
+        "name": root.name.split("_")[1],
+        "group": group,
+        "trial": trial_num,
+        "task_id": np.nan,
+        "algorithm": algo,
+        **dict.fromkeys(METRIC_COLUMNS, np.nan),
+        "error": None,
+    }
+    try:
+        subj = Subject(
+            root,
+            idt_consts=idt_consts,
+            smt_consts=smt_consts,
+            lazy=True,
+            result_store=result_store,
+        )
+        row["task_id"] = subj.trial_num_to_task_id(trial_num)
+        if algo == "IDT":
+            fix_df = subj.fixations_idt(trial_num)
+        elif algo == "SMT":
+            fix_df = subj.fixations_smt(trial_num)
+        else:
+            raise ValueError(f"Invalid algorithm: {algo}")
+        row.update(calculate_metrics(fix_df).iloc[0].to_dict())
+    except Exception as e:  # noqa: BLE001
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def run_cohort(
+    results_root: Path = Path("./results/subjects"),
+    trials: list[int] | None = None,
+    algorithms: tuple[AlgoType, ...] = ("IDT", "SMT"),
+    idt_consts: IDTConsts | None = None,
+    smt_consts: SMTConsts | None = None,
+    max_workers: int | None = None,
+    chunksize: int = 1,
+    result_store: ResultStore | None = None,
+) -> pd.DataFrame:
+    """Run every subject x trial x algorithm of a cohort across a process pool.
+
+    Returns a tidy DataFrame with one row per job, in the order of
+    `cohort_jobs`. Failed jobs have NaN metrics (<NA> for the `INT_COLUMNS`,
+    which are Int64) and a message in "error".
+    `max_workers=1` runs the jobs in this process. With a `result_store`,
+    only the trials whose file or consts changed are recomputed. The stage
+    timings of the workers are added to `profiling.PROFILER`.
+    """
+    jobs = cohort_jobs(results_root, trials, algorithms)
+    worker = partial(
+        run_job,
+        idt_consts=idt_consts if idt_consts is not None else IDTConsts(),
+        smt_consts=smt_consts if smt_consts is not None else SMTConsts(),
+        result_store=result_store,
+    )
+    if max_workers == 1:
+        rows = [worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(partial(run_profiled, worker), jobs, chunksize=chunksize))
+        # add the stage timings of the workers to this process's profiler
+        rows = []
+        for row, snapshot in results:
+            PROFILER.merge(snapshot)
+            rows.append(row)
+
+    result_df = pd.DataFrame(rows)
+    result_df[INT_COLUMNS] = result_df[INT_COLUMNS].astype("Int64")
+    for row in rows:
+        if row["error"] is not None:
+            logger.warning(
+                "%s trial %d (%s) failed: %s",
+                row["name"],
+                row["trial"],
+                row["algorithm"],
+                row["error"],
+            )
+    return result_df
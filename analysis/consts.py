@@ -5,20 +5,38 @@ from pathlib import Path
 SCREEN_WIDTH: int = 1920  # defaults: 1920
 SCREEN_HEIGHT: int = 1080  # defaults: 1080
 
+PIXELS_PER_DEGREE: int = 50  # ~1° of visual angle at the eye-display distance
+
 # Experiment settings
 TRIAL_DURATION: int = 20  # defaults: 20s
 
 # Postprocess settings
 TIME_WINDOW: int = 4  # defaults: 5s
 
+# Heatmap settings
+HEATMAP_SIGMA_DEG: float = 1.0  # defaults: 1° of visual angle
+HEATMAP_BIN_SIZE: int = 4  # defaults: 4x4 pixels per bin
+
+# Cache settings
+CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # defaults: 64MiB per subject
+RESULT_STORE_PATH = Path("./.result_store")
+RESULT_STORE_MAX_BYTES: int = 512 * 1024 * 1024  # defaults: 512MiB
+
 # Misc settings
 MASK_IMAGE_PATH = Path("./images/MaskTest.png")
 
 
 class AlgoConsts:
+    def to_json(self) -> str:
+        return json.dumps(self.__dict__, indent=2)
+
     def export_to_json(self, path: str):
         with open(path, "w") as f:
-            json.dump(self.__dict__, f, indent=2)
+            f.write(self.to_json())
+
+    def cache_key(self) -> tuple:
+        # hashable snapshot of the current values
+        return (type(self).__name__, *sorted(self.__dict__.items()))
 
 
 # I-DT settings
@@ -27,9 +45,11 @@ class IDTConsts(AlgoConsts):
         self,
         t_disp: int = 50, # defaults: 50
         t_dur: float = 0.1, # defaults: 0.1s
+        engine: str = "deque",  # "deque", "reach" or "naive"
     ) -> None:
         self.T_disp = t_disp  # the dispersion threshold 1° of visual angle
         self.T_dur = t_dur  # 100  # generally 100-200ms
+        self.ENGINE = engine  # "naive" rescans the whole window at every step
 
 
 # SMT settings
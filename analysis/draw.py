@@ -1,18 +1,39 @@
+from functools import lru_cache
+from pathlib import Path
+
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-import seaborn as sns
+import PIL.Image
 from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from PIL.Image import Image
 
-from .consts import SCREEN_HEIGHT, SCREEN_WIDTH
+from .consts import HEATMAP_BIN_SIZE, HEATMAP_SIGMA_DEG, SCREEN_HEIGHT, SCREEN_WIDTH
+from .fixations import FixationArray
+from .heatmap import gaze_heatmap, mass_threshold
 
 
-def imshow(ax: Axes, img: Image):
+def imshow(ax: Axes, img: Image | np.ndarray):
     ax.imshow(img, alpha=0.7)
 
 
-def plot_trial(df: pd.DataFrame, img: Image, title: str) -> None:
-    _fig, ax = plt.subplots(tight_layout=True)
+def _axes(ax: Axes | None) -> tuple[Figure, Axes]:
+    # draw into the given axes, or into a new pyplot figure
+    if ax is not None:
+        return ax.figure, ax
+    return plt.subplots(tight_layout=True)
+
+
+def plot_trial(
+    df: pd.DataFrame,
+    img: Image | np.ndarray,
+    title: str,
+    ax: Axes | None = None,
+) -> None:
+    fig, ax = _axes(ax)
 
     # plot image
     imshow(ax, img)
@@ -25,38 +46,51 @@ def plot_trial(df: pd.DataFrame, img: Image, title: str) -> None:
         cmap="viridis",
         s=10,
     )
-    cbar = plt.colorbar(sc, ax=ax)
+    cbar = fig.colorbar(sc, ax=ax)
     cbar.set_label("Elapsed Time (s)")  #
 
     # set title
     ax.set_title(title)
 
 
-def plot_trial_heatmap(df: pd.DataFrame, img: Image, title: str) -> None:
-    _fig, ax = plt.subplots(tight_layout=True)
+def plot_trial_heatmap(
+    df: pd.DataFrame,
+    img: Image | np.ndarray,
+    title: str,
+    sigma_deg: float = HEATMAP_SIGMA_DEG,
+    bin_size: int = HEATMAP_BIN_SIZE,
+    thresh: float = 0.3,
+    ax: Axes | None = None,
+) -> None:
+    fig, ax = _axes(ax)
 
     # plot image
     imshow(ax, img)
 
-    # plot eye data as heatmap
-    sns.kdeplot(
-        x=df["x"],
-        y=df["y"],
-        fill=True,
-        thresh=0.3,
-        cbar=True,
+    # plot eye data as heatmap, the lowest `thresh` of the mass is not drawn
+    heatmap = gaze_heatmap(df, sigma_deg, bin_size)
+    heatmap = np.ma.masked_less(heatmap, mass_threshold(heatmap, thresh))
+    n_rows, n_cols = heatmap.shape
+    mesh = ax.imshow(
+        heatmap,
         cmap="coolwarm",
         alpha=0.5,
-        levels=30,
-        ax=ax,
+        extent=(0, n_cols * bin_size, n_rows * bin_size, 0),
+        interpolation="bilinear",
     )
+    fig.colorbar(mesh, ax=ax)
 
     # set title
     ax.set_title(title)
 
 
-def plot_fixations(fix_df: pd.DataFrame, img: Image, title: str) -> None:
-    _fig, ax = plt.subplots(tight_layout=True)
+def plot_fixations(
+    fix_df: pd.DataFrame | FixationArray,
+    img: Image | np.ndarray,
+    title: str,
+    ax: Axes | None = None,
+) -> None:
+    _fig, ax = _axes(ax)
 
     imshow(ax, img)
 
@@ -73,66 +107,124 @@ def plot_fixations(fix_df: pd.DataFrame, img: Image, title: str) -> None:
     ax.set_ylabel("Y-coordinate")
 
 
-def plot_scanpath(df_org: pd.DataFrame, img: Image, title: str) -> None:
-    df = df_org.copy()
-    min_time = df["duration"].min()
-    max_time = df["duration"].max()
-
+@lru_cache(maxsize=16)
+def load_background(img_path: str) -> np.ndarray:
+    """Decoded background image, decoded once per task image and shared."""
+    with PIL.Image.open(img_path) as img:
+        background = np.asarray(img.convert("RGBA"))
+    background.flags.writeable = False
+    return background
+
+
+def _scanpath_figure(ax: Axes | None, save_path: Path | None) -> tuple[Figure, Axes]:
+    if ax is not None:
+        return ax.figure, ax
+    if save_path is not None:
+        # render off-screen with Agg, outside of pyplot's figure manager, with
+        # a fixed layout so the figure is drawn only once
+        fig = Figure(figsize=(12, 8))
+        fig.subplots_adjust(left=0.06, right=0.98, bottom=0.07, top=0.95)
+        FigureCanvasAgg(fig)
+        return fig, fig.add_subplot()
+    fig, ax = plt.subplots(tight_layout=True, figsize=(12, 8))
+    return fig, ax
+
+
+def plot_scanpath(
+    df: pd.DataFrame | FixationArray,
+    img: Image | np.ndarray,
+    title: str,
+    ax: Axes | None = None,
+    save_path: Path | None = None,
+    color_by_time: bool = False,
+    arrows: bool = False,
+) -> Figure:
+    """Fixations as circles sized by duration, saccades as lines between them.
+
+    All the saccades are drawn as one LineCollection, coloured by time with
+    `color_by_time`, and `arrows` adds their direction. Draws into `ax` if
+    given; with `save_path`, renders the figure to that file with Agg
+    instead of showing it.
+    """
+    xs = np.asarray(df["x"])
+    ys = np.asarray(df["y"])
+    durations = np.asarray(df["duration"], dtype=np.float64)
+    if "time_start" in df.columns:
+        times = np.asarray(df["time_start"])
+        time_label = "Time (s)"
+    else:
+        # fixations without timing are coloured by order
+        times = np.arange(len(xs))
+        time_label = "Fixation order"
     # Normalize fixation durations to assign circle sizes proportionally
     size_range = (100, 600)
-    df["size"] = (df["duration"] - min_time) / (max_time - min_time) * (
-        size_range[1] - size_range[0]
-    ) + size_range[0]
+    if len(durations) and np.ptp(durations) > 0:
+        min_time = durations.min()
+        max_time = durations.max()
+        scale = (durations - min_time) / (max_time - min_time)
+    else:
+        # no fixations (the axes are still drawn) or all of the same duration
+        scale = np.zeros_like(durations)
+    sizes = scale * (size_range[1] - size_range[0]) + size_range[0]
 
     # # Range for transparency of circle
     # alpha_range = (0.4, 0.8)
     # df['alpha'] = (df['duration'] - min_time) / (max_time - min_time) * (alpha_range[1] - alpha_range[0]) + alpha_range[0]
 
     # Plotting Fixations
-    fig, ax = plt.subplots(tight_layout=True, figsize=(12, 8))
-    # plt.figure(figsize=(12, 8))
+    show = ax is None and save_path is None
+    fig, ax = _scanpath_figure(ax, save_path)
     imshow(ax, img)
 
     # Scatter plot for fixations
     # plt.scatter(df['x'], df['y'], label='Fixations', marker='o', s=df['size'], color='purple', alpha=df['alpha'], edgecolor='white', linewidth= 0.4)
     sc = ax.scatter(
-        df["x"],
-        df["y"],
+        xs,
+        ys,
         label="Fixations",
         marker="o",
-        s=df["size"],
-        c=df["time_start"],
+        s=sizes,
+        c=times,
         alpha=0.5,
         edgecolor="white",
         linewidth=0.5,
     )
-    plt.colorbar(sc, ax=ax).set_label("Time (s)")
-
-    # Plot saccades (lines between consecutive fixations)
-    plotted_saccades = False  # Flag to add saccades label only once
-    for i in range(1, len(df)):
-        x1, y1 = df["x"].iloc[i - 1], df["y"].iloc[i - 1]
-        x2, y2 = df["x"].iloc[i], df["y"].iloc[i]
-        if not plotted_saccades:  # Add label for saccades only once
-            ax.plot(
-                [x1, x2],
-                [y1, y2],
-                color="cyan",
-                linestyle="-",
-                linewidth=1,
-                alpha=0.8,
-                label="Saccades",
-            )
-            plotted_saccades = True
+    fig.colorbar(sc, ax=ax).set_label(time_label)
+
+    # Plot saccades (lines between consecutive fixations) as one artist
+    points = np.column_stack([xs, ys])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    saccades = LineCollection(
+        segments,
+        linestyle="-",
+        linewidth=1,
+        alpha=0.8,
+        label="Saccades",
+    )
+    if color_by_time:
+        saccades.set_array(times[:-1])
+        saccades.set_cmap(sc.get_cmap())
+        saccades.set_norm(sc.norm)
+    else:
+        saccades.set_color("cyan")
+    ax.add_collection(saccades)
+    if arrows and len(segments):
+        deltas = segments[:, 1] - segments[:, 0]
+        quiver_args = [segments[:, 0, 0], segments[:, 0, 1], deltas[:, 0], deltas[:, 1]]
+        if color_by_time:
+            colors = {"cmap": sc.get_cmap(), "norm": sc.norm}
+            quiver_args.append(times[:-1])
         else:
-            ax.plot(
-                [x1, x2],
-                [y1, y2],
-                color="cyan",
-                linestyle="-",
-                linewidth=1,
-                alpha=0.8,
-            )
+            colors = {"color": "cyan"}
+        ax.quiver(
+            *quiver_args,
+            angles="xy",
+            scale_units="xy",
+            scale=1,
+            alpha=0.8,
+            width=0.002,
+            **colors,
+        )
 
     # Titles and labels
     # plt.title(f'Fixation Visualization for {task_name} Task')
@@ -144,4 +236,8 @@ def plot_scanpath(df_org: pd.DataFrame, img: Image, title: str) -> None:
     ax.legend()
     ax.grid(False)
     ax.axis("on")
-    fig.show(warn=False)
+    if save_path is not None:
+        fig.savefig(save_path, pil_kwargs={"compress_level": 1})
+    elif show:
+        fig.show(warn=False)
+    return fig
@@ -1,40 +1,15 @@
-from PIL import Image
-import numpy as np
+from .aoi import get_aoi_index, make_mask
 
-
-def make_mask(mask: np.ndarray, color: tuple[int, int, int]) -> np.ndarray:
-    return (
-        (mask[..., 0] == color[0])
-        & (mask[..., 1] == color[1])
-        & (mask[..., 2] == color[2])
-    )
+__all__ = ["get_left_mask", "get_right_mask", "get_timer_mask", "make_mask"]
 
 
 def get_timer_mask() -> tuple[tuple[int, int], tuple[int, int]]:
-    mask = Image.open("./images/MaskTest.png")
-    mask = np.array(mask)[..., :-1]
-    red_mask = make_mask(mask, (255, 0, 0))
-    y, x = np.where(red_mask)
-    y_min, y_max = y.min(), y.max()
-    x_min, x_max = x.min(), x.max()
-    return (x_min, x_max), (y_min, y_max)
+    return get_aoi_index().bboxes["timer"]
 
 
 def get_left_mask() -> tuple[tuple[int, int], tuple[int, int]]:
-    mask = Image.open("./images/MaskTest.png")
-    mask = np.array(mask)[..., :-1]
-    green_mask = make_mask(mask, (0, 255, 0))
-    y, x = np.where(green_mask)
-    y_min, y_max = y.min(), y.max()
-    x_min, x_max = x.min(), x.max()
-    return (x_min, x_max), (y_min, y_max)
+    return get_aoi_index().bboxes["left"]
 
 
 def get_right_mask() -> tuple[tuple[int, int], tuple[int, int]]:
-    mask = Image.open("./images/MaskTest.png")
-    mask = np.array(mask)[..., :-1]
-    blue_mask = make_mask(mask, (0, 0, 255))
-    y, x = np.where(blue_mask)
-    y_min, y_max = y.min(), y.max()
-    x_min, x_max = x.min(), x.max()
-    return (x_min, x_max), (y_min, y_max)
+    return get_aoi_index().bboxes["right"]
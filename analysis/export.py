@@ -0,0 +1,177 @@
+import argparse
+import csv
+import hashlib
+import io as _io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .consts import IDTConsts
+from .io import _atomic_write, file_digest, load_path
+from .logger_config import logger
+from .profiling import PROFILER, run_profiled
+from .subject import Subject
+
+# the MFD tables, one per group, named as the files of make_csv.ipynb
+GROUPS = {"timer": "with_timer", "control": "without_timer"}
+N_TASKS = 4
+MFD_COLUMNS = [
+    "Name",
+    *(f"Task{task_id}_MFD" for task_id in range(1, N_TASKS + 1)),
+    *(f"Task{task_id}_MFD_SD" for task_id in range(1, N_TASKS + 1)),
+    "Overall_MFD",
+    "Overall_MFD_SD",
+]
+# typed binary copy of a table (`np.load`), the width of "Name" is set per table
+MFD_FIELDS = [(name, "<f8") for name in MFD_COLUMNS[1:]]
+MANIFEST_NAME = ".mfd_manifest.json"
+
+# bump when a change in the package changes the exported values
+EXPORT_VERSION = 1
+
+
+def subject_key(root: Path, idt_consts: IDTConsts) -> str:
+    """Hash of the inputs of a subject's MFD row: its trial files, trial order and consts."""
+    h = hashlib.sha256()
+    parts = [str(EXPORT_VERSION), idt_consts.to_json(), file_digest(root / "trials_order.txt")]
+    parts += [file_digest(root / f"trial_{trial_num}.csv") for trial_num in range(1, N_TASKS + 1)]
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def mfd_row(subj: Subject) -> list:
+    """Name, the mean and SD of the IDT fixation durations of every task, and their means.
+
+    The tasks are the trials after the first one, in the order of
+    `make_csv.ipynb`'s `get_csv_line`.
+    """
+    trials = [subj.task_id_to_trial_num(task_id) for task_id in subj.task_order[1:]]
+    metrics = subj.fixations_idt_batch(trials).metrics(["mfd", "sd_fd"])
+    mfd_list = metrics["mfd"].tolist()
+    mfd_sd_list = metrics["sd_fd"].tolist()
+    mfd_overall = float(np.mean(mfd_list))
+    mfd_sd_overall = float(np.mean(mfd_sd_list))
+    return [subj.name, *mfd_list, *mfd_sd_list, mfd_overall, mfd_sd_overall]
+
+
+def _row_job(root: Path, idt_consts: IDTConsts) -> tuple[list | None, str | None]:
+    # errors are returned instead of raised, as in `cohort.run_job`
+    try:
+        subj = Subject(root, idt_consts=idt_consts, lazy=True)
+        return mfd_row(subj), None
+    except Exception as e:  # noqa: BLE001
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _load_manifest(out_dir: Path) -> dict:
+    path = out_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_table(out_dir: Path, name: str, rows: list[list]) -> pd.DataFrame:
+    # every file is written once, next to its destination and then renamed
+    buffer = _io.StringIO(newline="")
+    csv_writer = csv.writer(buffer, delimiter=",")
+    csv_writer.writerow(MFD_COLUMNS)
+    csv_writer.writerows(rows)
+    _atomic_write(out_dir / f"{name}.csv", lambda f: f.write(buffer.getvalue().encode()))
+
+    name_len = max((len(row[0]) for row in rows), default=1)
+    dtype = np.dtype([("Name", f"<U{name_len}"), *MFD_FIELDS])
+    records = np.array([tuple(row) for row in rows], dtype=dtype)
+    _atomic_write(out_dir / f"{name}.npy", lambda f: np.save(f, records))
+    return pd.DataFrame(rows, columns=MFD_COLUMNS)
+
+
+def export_mfd(
+    out_dir: Path = Path("./results/csv"),
+    results_root: Path = Path("./results/subjects"),
+    idt_consts: IDTConsts | None = None,
+    max_workers: int | None = None,
+    force: bool = False,
+) -> dict[str, pd.DataFrame]:
+    """Write the MFD table of every group as `<out_dir>/<with|without>_timer.{csv,npy}`.
+
+    The subjects are computed across a process pool (`max_workers=1` runs
+    them in this process). A manifest in `out_dir` keeps the row and the
+    input hash of every subject, so subjects whose trial files and consts
+    did not change are not recomputed unless `force`. Subjects that fail
+    are logged and left out of the tables.
+    Returns the written tables by file name.
+    """
+    out_dir = Path(out_dir)
+    idt_consts = idt_consts if idt_consts is not None else IDTConsts()
+    manifest = {} if force else _load_manifest(out_dir)
+
+    timer_subj_roots, control_subj_roots = load_path(results_root)
+    roots = {"timer": timer_subj_roots, "control": control_subj_roots}
+    all_roots = [*timer_subj_roots, *control_subj_roots]
+    keys = {root: subject_key(root, idt_consts) for root in all_roots}
+    todo = [root for root, key in keys.items() if manifest.get(root.name, {}).get("key") != key]
+
+    worker = partial(_row_job, idt_consts=idt_consts)
+    if max_workers == 1 or len(todo) <= 1:
+        results = [worker(root) for root in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = []
+            for result, snapshot in executor.map(partial(run_profiled, worker), todo):
+                PROFILER.merge(snapshot)
+                results.append(result)
+
+    new_manifest = {}
+    for root, (row, error) in zip(todo, results):
+        if error is not None:
+            logger.warning("%s failed: %s", root.name, error)
+            continue
+        new_manifest[root.name] = {"key": keys[root], "row": row}
+    for root, key in keys.items():
+        if root.name not in new_manifest and root not in todo:
+            new_manifest[root.name] = {"key": key, "row": manifest[root.name]["row"]}
+    logger.info(
+        "MFD export: %d subjects computed, %d unchanged",
+        len(todo),
+        len(keys) - len(todo),
+    )
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tables = {}
+    for group, name in GROUPS.items():
+        rows = [new_manifest[r.name]["row"] for r in roots[group] if r.name in new_manifest]
+        tables[name] = _write_table(out_dir, name, rows)
+    manifest_json = json.dumps(new_manifest, indent=1)
+    _atomic_write(out_dir / MANIFEST_NAME, lambda f: f.write(manifest_json.encode()))
+    return tables
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m analysis export",
+        description="Write the mean fixation duration tables of both groups.",
+    )
+    parser.add_argument("--out", type=Path, default=Path("./results/csv"))
+    parser.add_argument("--results-root", type=Path, default=Path("./results/subjects"))
+    parser.add_argument("--t-disp", type=int, default=IDTConsts().T_disp)
+    parser.add_argument("--t-dur", type=float, default=IDTConsts().T_dur)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--force", action="store_true", help="recompute unchanged subjects too")
+    args = parser.parse_args(argv)
+
+    tables = export_mfd(
+        args.out,
+        args.results_root,
+        idt_consts=IDTConsts(t_disp=args.t_disp, t_dur=args.t_dur),
+        max_workers=args.workers,
+        force=args.force,
+    )
+    for name, table in tables.items():
+        print(f"{args.out / name}.csv: {len(table)} subjects")
@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Literal
+
+import matplotlib as mpl
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from .consts import IDTConsts, SMTConsts
+from .io import _atomic_write, file_digest, load_path
+from .logger_config import logger
+from .profiling import PROFILER, run_profiled
+from .subject import AlgoType, Subject
+
+PlotType = Literal["trial", "heatmap", "fixations", "scanpath"]
+PLOT_TYPES: tuple[PlotType, ...] = ("trial", "heatmap", "fixations", "scanpath")
+# plot types drawn from the fixations of an algorithm
+ALGO_PLOT_TYPES = ("fixations", "scanpath")
+FIGSIZES = {
+    "trial": (6.4, 4.8),
+    "heatmap": (6.4, 4.8),
+    "fixations": (6.4, 4.8),
+    "scanpath": (12, 8),
+}
+MANIFEST_NAME = "manifest.json"
+REPORT_COLUMNS = [
+    "name",
+    "group",
+    "trial",
+    "plot",
+    "algorithm",
+    "path",
+    "status",
+    "seconds",
+    "error",
+]
+
+# bump when a change in the package changes the figures
+FIGURES_VERSION = 2
+
+# one figure: (plot type, algorithm or None, output path, up-to-date key)
+Plot = tuple[PlotType, AlgoType | None, Path, str]
+# one job, all the figures of a trial: (subject root, group, trial number, plots)
+FigureJob = tuple[Path, str, int, list[Plot]]
+
+
+def figure_key(
+    subj: Subject,
+    trial_num: int,
+    plot_type: PlotType,
+    algo: AlgoType | None,
+) -> str:
+    """Hash of everything a figure is drawn from: trial file, image, plot and consts."""
+    img_path = Path(f"./images/Trial{subj.trial_num_to_task_id(trial_num)}.png")
+    parts = [str(FIGURES_VERSION), file_digest(subj.trial_path(trial_num)), plot_type]
+    parts.append(file_digest(img_path) if img_path.exists() else "")
+    if algo == "IDT":
+        parts.extend((algo, subj.idt_consts.to_json()))
+    elif algo == "SMT":
+        parts.extend((algo, subj.smt_consts.to_json()))
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def figure_path(
+    out_dir: Path,
+    subj: Subject,
+    group: str,
+    trial_num: int,
+    plot_type: PlotType,
+    algo: AlgoType | None,
+) -> Path:
+    suffix = f"_{algo}" if algo is not None else ""
+    return out_dir / group / subj.name / f"trial{trial_num}_{plot_type}{suffix}.png"
+
+
+def load_manifest(out_dir: Path) -> dict[str, str]:
+    path = out_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(out_dir: Path, manifest: dict[str, str]) -> None:
+    manifest_json = json.dumps(manifest, indent=1, sort_keys=True)
+    _atomic_write(out_dir / MANIFEST_NAME, lambda f: f.write(manifest_json.encode()))
+
+
+def render_figure(
+    subj: Subject,
+    trial_num: int,
+    plot_type: PlotType,
+    algo: AlgoType | None,
+    path: Path,
+) -> None:
+    """Draw one plot of a trial to `path` with Agg, outside of pyplot."""
+    fig = Figure(figsize=FIGSIZES[plot_type])
+    FigureCanvasAgg(fig)
+    if plot_type == "scanpath":
+        # fixed layout, as `draw.plot_scanpath` uses when saving
+        fig.subplots_adjust(left=0.06, right=0.98, bottom=0.07, top=0.95)
+    else:
+        fig.set_layout_engine("tight")
+    ax = fig.add_subplot()
+    try:
+        if plot_type == "trial":
+            subj.plot_trial(trial_num, ax=ax)
+        elif plot_type == "heatmap":
+            subj.plot_trial_heatmap(trial_num, ax=ax)
+        elif plot_type == "fixations":
+            subj.plot_fixations(trial_num, algo, ax=ax)
+        elif plot_type == "scanpath":
+            subj.plot_scanpath(trial_num, algo, ax=ax)
+        else:
+            raise ValueError(f"Invalid plot type: {plot_type}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write next to the output and rename, so no half-written figure is left
+        _atomic_write(
+            path, lambda f: fig.savefig(f, format="png", pil_kwargs={"compress_level": 1})
+        )
+    finally:
+        fig.clear()
+
+
+def _init_worker() -> None:
+    # workers never show figures
+    mpl.use("Agg")
+
+
+def render_job(job: FigureJob, idt_consts: IDTConsts, smt_consts: SMTConsts) -> list[dict]:
+    """Render the figures of one trial, one report row per figure.
+
+    The trial is loaded once for all its figures. Errors are returned in the
+    "error" column instead of being raised.
+    """
+    root, group, trial_num, plots = job
+    subj = Subject(root, idt_consts=idt_consts, smt_consts=smt_consts, lazy=True)
+    rows = []
+    for plot_type, algo, path, _key in plots:
+        row = _report_row(subj, group, trial_num, plot_type, algo, path, "rendered")
+        start = time.perf_counter()
+        try:
+            render_figure(subj, trial_num, plot_type, algo, path)
+        except Exception as e:  # noqa: BLE001
+            row["status"] = "error"
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["seconds"] = time.perf_counter() - start
+        rows.append(row)
+    return rows
+
+
+def _report_row(
+    subj: Subject,
+    group: str,
+    trial_num: int,
+    plot_type: PlotType,
+    algo: AlgoType | None,
+    path: Path,
+    status: str,
+) -> dict:
+    values = [subj.name, group, trial_num, plot_type, algo, str(path), status, 0.0, None]
+    return dict(zip(REPORT_COLUMNS, values))
+
+
+def export_figures(
+    out_dir: Path,
+    results_root: Path = Path("./results/subjects"),
+    plot_types: tuple[PlotType, ...] = PLOT_TYPES,
+    trials: list[int] | None = None,
+    algorithms: tuple[AlgoType, ...] = ("IDT", "SMT"),
+    idt_consts: IDTConsts | None = None,
+    smt_consts: SMTConsts | None = None,
+    max_workers: int | None = None,
+    force: bool = False,
+) -> pd.DataFrame:
+    """Render the plots of every subject x trial of a cohort to PNG files.
+
+    Figures are drawn with Agg across a process pool, one job per trial, and
+    written to `out_dir/<group>/<name>/trial<N>_<plot>[_<algo>].png`. A
+    manifest in `out_dir` records what every figure was drawn from, so
+    figures that are up to date are skipped unless `force`.
+    Returns one row per figure with its "status" (rendered, skipped or
+    error) and render "seconds"; see `summarize_figures`.
+    `max_workers=1` renders in this process.
+    """
+    out_dir = Path(out_dir)
+    idt_consts = idt_consts if idt_consts is not None else IDTConsts()
+    smt_consts = smt_consts if smt_consts is not None else SMTConsts()
+    for plot_type in plot_types:
+        if plot_type not in PLOT_TYPES:
+            raise ValueError(f"Invalid plot type: {plot_type}")
+    manifest = load_manifest(out_dir)
+
+    jobs: list[FigureJob] = []
+    skipped = []
+    timer_subj_roots, control_subj_roots = load_path(results_root)
+    for group, roots in (("timer", timer_subj_roots), ("control", control_subj_roots)):
+        for root in roots:
+            subj = Subject(root, idt_consts=idt_consts, smt_consts=smt_consts, lazy=True)
+            for trial_num in trials if trials is not None else subj.all_trials:
+                plots = []
+                for plot_type in plot_types:
+                    algos = algorithms if plot_type in ALGO_PLOT_TYPES else (None,)
+                    for algo in algos:
+                        path = figure_path(out_dir, subj, group, trial_num, plot_type, algo)
+                        key = figure_key(subj, trial_num, plot_type, algo)
+                        rel = path.relative_to(out_dir).as_posix()
+                        if not force and path.exists() and manifest.get(rel) == key:
+                            skipped.append(
+                                _report_row(subj, group, trial_num, plot_type, algo, path, "skipped")
+                            )
+                        else:
+                            plots.append((plot_type, algo, path, key))
+                if plots:
+                    jobs.append((root, group, trial_num, plots))
+
+    worker = partial(render_job, idt_consts=idt_consts, smt_consts=smt_consts)
+    if max_workers == 1 or len(jobs) <= 1:
+        results = [worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            results = []
+            for job_rows, snapshot in executor.map(partial(run_profiled, worker), jobs):
+                PROFILER.merge(snapshot)
+                results.append(job_rows)
+
+    rows = skipped
+    keys = {path: key for job in jobs for _type, _algo, path, key in job[3]}
+    for job_rows in results:
+        for row in job_rows:
+            rows.append(row)
+            rel = Path(row["path"]).relative_to(out_dir).as_posix()
+            if row["status"] == "rendered":
+                manifest[rel] = keys[Path(row["path"])]
+            else:
+                manifest.pop(rel, None)
+                logger.warning(
+                    "%s trial %d (%s) failed: %s",
+                    row["name"],
+                    row["trial"],
+                    row["plot"],
+                    row["error"],
+                )
+    if jobs:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        _write_manifest(out_dir, manifest)
+
+    report_df = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    report_df = report_df.sort_values(["group", "name", "trial", "plot"], kind="stable")
+    return report_df.reset_index(drop=True)
+
+
+def summarize_figures(report_df: pd.DataFrame) -> pd.DataFrame:
+    """Render time of the rendered figures per plot type, with skip and error counts."""
+    summary = report_df.groupby("plot").agg(
+        rendered=("status", lambda s: int((s == "rendered").sum())),
+        skipped=("status", lambda s: int((s == "skipped").sum())),
+        errors=("status", lambda s: int((s == "error").sum())),
+    )
+    seconds = report_df[report_df["status"] == "rendered"].groupby("plot")["seconds"]
+    summary["total_s"] = seconds.sum()
+    summary["mean_s"] = seconds.mean()
+    summary["p95_s"] = seconds.quantile(0.95)
+    summary["max_s"] = seconds.max()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m analysis figures",
+        description="Render the figures of a cohort to PNG files.",
+    )
+    parser.add_argument("out_dir", type=Path)
+    parser.add_argument("--results-root", type=Path, default=Path("./results/subjects"))
+    parser.add_argument("--plots", nargs="+", choices=PLOT_TYPES, default=list(PLOT_TYPES))
+    parser.add_argument("--trials", nargs="+", type=int)
+    parser.add_argument("--algorithms", nargs="+", choices=("IDT", "SMT"), default=["IDT", "SMT"])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--force", action="store_true", help="render up-to-date figures too")
+    args = parser.parse_args(argv)
+
+    report_df = export_figures(
+        args.out_dir,
+        args.results_root,
+        plot_types=tuple(args.plots),
+        trials=args.trials,
+        algorithms=tuple(args.algorithms),
+        max_workers=args.workers,
+        force=args.force,
+    )
+    print(summarize_figures(report_df).to_string())
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+# one fixation record, the same for every detector: the centroid of its
+# samples, the times of its first and last samples, the duration in seconds
+# and the I-DT dispersion (x range + y range) of its samples.
+# "aoi" is the AOIIndex label, NO_AOI when not classified
+FIXATION_DTYPE = np.dtype(
+    [
+        ("x", np.float32),
+        ("y", np.float32),
+        ("time_start", np.float64),
+        ("time_end", np.float64),
+        ("duration", np.float32),
+        ("dispersion", np.float32),
+        ("aoi", np.int8),
+    ]
+)
+FIXATION_COLUMNS = ["x", "y", "time_start", "time_end", "duration", "dispersion"]
+NO_AOI = -1
+
+
+class FixationArray:
+    """Fixations stored in one structured array of `FIXATION_DTYPE`.
+
+    Indexing with a column name returns a view of that field, and slices
+    return views too, so the fixations are only copied by `to_frame`.
+    It can be read like the fixation DataFrame (`fix["x"]`, `len(fix)`,
+    `fix.columns`).
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: np.ndarray) -> None:
+        if data.dtype != FIXATION_DTYPE:
+            raise ValueError(f"Invalid fixation dtype: {data.dtype}")
+        self.data = data
+
+    @classmethod
+    def empty(cls, n: int = 0) -> "FixationArray":
+        data = np.zeros(n, dtype=FIXATION_DTYPE)
+        data["aoi"] = NO_AOI
+        return cls(data)
+
+    @classmethod
+    def from_records(cls, records) -> "FixationArray":
+        """From rows of (x, y, time_start, time_end, duration, dispersion)."""
+        records = np.asarray(records, dtype=np.float64).reshape(-1, len(FIXATION_COLUMNS))
+        fixations = cls.empty(len(records))
+        for i, name in enumerate(FIXATION_COLUMNS):
+            fixations.data[name] = records[:, i]
+        return fixations
+
+    @classmethod
+    def from_frame(cls, fix_df: pd.DataFrame) -> "FixationArray":
+        fixations = cls.empty(len(fix_df))
+        for name in FIXATION_COLUMNS:
+            fixations.data[name] = fix_df[name].to_numpy()
+        if "aoi" in fix_df.columns:
+            fixations.data["aoi"] = fix_df["aoi"].to_numpy()
+        return fixations
+
+    @property
+    def columns(self) -> list[str]:
+        return list(FIXATION_DTYPE.names)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[key]
+        return FixationArray(self.data[key])
+
+    def __repr__(self) -> str:
+        return f"FixationArray(n={len(self.data)})"
+
+    def readonly(self) -> "FixationArray":
+        """A view that cannot be written to, e.g. to share cached fixations."""
+        data = self.data.view()
+        data.flags.writeable = False
+        return FixationArray(data)
+
+    def with_aoi(self, aoi_index) -> "FixationArray":
+        """A copy with the "aoi" field set from `aoi_index.classify`."""
+        data = self.data.copy()
+        data["aoi"] = aoi_index.classify(data["x"], data["y"])
+        return FixationArray(data)
+
+    def to_frame(self, aoi: bool = False) -> pd.DataFrame:
+        """The fixations as the DataFrame of the detectors (float64 columns)."""
+        columns = {name: self.data[name].astype(np.float64) for name in FIXATION_COLUMNS}
+        if aoi:
+            columns["aoi"] = self.data["aoi"].copy()
+        return pd.DataFrame(columns)
+
+
+class FixationBuffer:
+    """Growable preallocated storage the detectors append fixations to."""
+
+    def __init__(self, capacity: int = 64) -> None:
+        self._data = np.empty(max(capacity, 1), dtype=FIXATION_DTYPE)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(min_capacity, 2 * len(self._data))
+        data = np.empty(capacity, dtype=FIXATION_DTYPE)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+    def reserve(self, capacity: int) -> None:
+        """Make room for `capacity` fixations in total."""
+        if capacity > len(self._data):
+            self._grow(capacity)
+
+    def append(
+        self,
+        x: float,
+        y: float,
+        time_start: float,
+        time_end: float,
+        duration: float,
+        dispersion: float,
+        aoi: int = NO_AOI,
+    ) -> None:
+        if self._size == len(self._data):
+            self._grow(self._size + 1)
+        self._data[self._size] = (x, y, time_start, time_end, duration, dispersion, aoi)
+        self._size += 1
+
+    def extend(self, fixations: FixationArray) -> None:
+        end = self._size + len(fixations)
+        if end > len(self._data):
+            self._grow(end)
+        self._data[self._size : end] = fixations.data
+        self._size = end
+
+    def view(self) -> FixationArray:
+        """The appended fixations, without copying them."""
+        return FixationArray(self._data[: self._size])
+
+
+def aggregate_runs(points: np.ndarray, run_starts: np.ndarray) -> FixationArray:
+    """One fixation per run of consecutive samples, in one pass over the samples.
+
+    `points` are (elapsed_time_s, x, y) rows and `run_starts` the sorted first
+    index of every run, starting at 0; a run ends where the next one starts.
+    Every run gets the centroid, start and end time, duration and dispersion
+    of its samples, like an I-DT fixation. Select the fixation runs after.
+    """
+    fixations = FixationArray.empty(len(run_starts))
+    if len(run_starts) == 0:
+        return fixations
+    times = points[:, 0]
+    xs = points[:, 1]
+    ys = points[:, 2]
+    counts = np.diff(np.append(run_starts, len(points)))
+    run_ends = run_starts + counts - 1
+    data = fixations.data
+    data["x"] = np.add.reduceat(xs, run_starts) / counts
+    data["y"] = np.add.reduceat(ys, run_starts) / counts
+    data["time_start"] = times[run_starts]
+    data["time_end"] = times[run_ends]
+    data["duration"] = times[run_ends] - times[run_starts]
+    x_range = np.maximum.reduceat(xs, run_starts) - np.minimum.reduceat(xs, run_starts)
+    y_range = np.maximum.reduceat(ys, run_starts) - np.minimum.reduceat(ys, run_starts)
+    data["dispersion"] = x_range + y_range
+    return fixations
@@ -0,0 +1,150 @@
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+from .consts import (
+    HEATMAP_BIN_SIZE,
+    HEATMAP_SIGMA_DEG,
+    PIXELS_PER_DEGREE,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+)
+from .fixations import FixationArray
+
+SmoothMethod = Literal["separable", "fft"]
+
+
+def grid_shape(bin_size: int = HEATMAP_BIN_SIZE) -> tuple[int, int]:
+    # (rows, columns) of a screen grid with square bins of `bin_size` pixels
+    return (-(-SCREEN_HEIGHT // bin_size), -(-SCREEN_WIDTH // bin_size))
+
+
+def bin_gaze(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    weights: np.ndarray | None = None,
+    bin_size: int = HEATMAP_BIN_SIZE,
+) -> np.ndarray:
+    """Histogram of the gaze positions over the screen, indexed [row (y), column (x)].
+
+    Positions outside of the screen are dropped. Grids of the same `bin_size`
+    can be summed, e.g. over trials or subjects, before smoothing.
+    """
+    n_rows, n_cols = grid_shape(bin_size)
+    grid, _, _ = np.histogram2d(
+        np.asarray(ys, dtype=np.float64),
+        np.asarray(xs, dtype=np.float64),
+        bins=(n_rows, n_cols),
+        range=((0, n_rows * bin_size), (0, n_cols * bin_size)),
+        weights=None if weights is None else np.asarray(weights, dtype=np.float64),
+    )
+    return grid
+
+
+def gaussian_kernel(sigma: float, truncate: float = 4.0) -> np.ndarray:
+    """Normalized 1D Gaussian kernel, cut at `truncate` sigmas."""
+    radius = max(int(truncate * sigma + 0.5), 1)
+    offsets = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def _fft_size(n: int) -> int:
+    # next power of two, fast for numpy's FFT
+    return 1 << max(n - 1, 1).bit_length()
+
+
+def _convolve_axis(grid: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+    # "same" convolution with zeros outside of the grid, along one axis
+    n = grid.shape[axis]
+    radius = len(kernel) // 2
+    size = _fft_size(n + len(kernel) - 1)
+    spectrum = np.fft.rfft(grid, size, axis=axis)
+    shape = [1, 1]
+    shape[axis] = -1
+    spectrum *= np.fft.rfft(kernel, size).reshape(shape)
+    full = np.fft.irfft(spectrum, size, axis=axis)
+    return np.take(full, np.arange(radius, radius + n), axis=axis)
+
+
+def smooth(
+    grid: np.ndarray,
+    sigma_deg: float = HEATMAP_SIGMA_DEG,
+    bin_size: int = HEATMAP_BIN_SIZE,
+    method: SmoothMethod = "separable",
+) -> np.ndarray:
+    """Gaussian smoothing of a binned grid, with sigma in degrees of visual angle.
+
+    "separable" convolves the rows and then the columns with a 1D kernel,
+    "fft" convolves with the 2D kernel in one 2D FFT. Both give the same grid.
+    """
+    sigma = sigma_deg * PIXELS_PER_DEGREE / bin_size
+    if sigma <= 0:
+        return grid.astype(np.float64)
+    kernel = gaussian_kernel(sigma)
+    if method == "separable":
+        smoothed = _convolve_axis(grid, kernel, axis=1)
+        smoothed = _convolve_axis(smoothed, kernel, axis=0)
+    elif method == "fft":
+        n_rows, n_cols = grid.shape
+        radius = len(kernel) // 2
+        size = (_fft_size(n_rows + 2 * radius), _fft_size(n_cols + 2 * radius))
+        spectrum = np.fft.rfft2(grid, size) * np.fft.rfft2(np.outer(kernel, kernel), size)
+        full = np.fft.irfft2(spectrum, size)
+        smoothed = full[radius : radius + n_rows, radius : radius + n_cols]
+    else:
+        raise ValueError(f"Invalid method: {method}")
+    # rounding of the FFT leaves tiny negative values around empty areas
+    return np.maximum(smoothed, 0)
+
+
+def gaze_heatmap(
+    df: pd.DataFrame,
+    sigma_deg: float = HEATMAP_SIGMA_DEG,
+    bin_size: int = HEATMAP_BIN_SIZE,
+    method: SmoothMethod = "separable",
+) -> np.ndarray:
+    """Smoothed heatmap of the raw gaze samples of a trial."""
+    grid = bin_gaze(df["x"].to_numpy(), df["y"].to_numpy(), bin_size=bin_size)
+    return smooth(grid, sigma_deg, bin_size, method)
+
+
+def fixation_heatmap(
+    fix_df: pd.DataFrame | FixationArray,
+    sigma_deg: float = HEATMAP_SIGMA_DEG,
+    bin_size: int = HEATMAP_BIN_SIZE,
+    method: SmoothMethod = "separable",
+) -> np.ndarray:
+    """Smoothed heatmap of the fixations, weighted by their duration."""
+    grid = bin_gaze(fix_df["x"], fix_df["y"], weights=fix_df["duration"], bin_size=bin_size)
+    return smooth(grid, sigma_deg, bin_size, method)
+
+
+def cohort_heatmap(
+    grids,
+    sigma_deg: float = HEATMAP_SIGMA_DEG,
+    bin_size: int = HEATMAP_BIN_SIZE,
+    method: SmoothMethod = "separable",
+) -> np.ndarray:
+    """Heatmap of several binned grids (`bin_gaze`), e.g. one per subject.
+
+    Smoothing is linear, so the grids are summed first and smoothed once.
+    """
+    total = np.zeros(grid_shape(bin_size))
+    for grid in grids:
+        total += grid
+    return smooth(total, sigma_deg, bin_size, method)
+
+
+def mass_threshold(heatmap: np.ndarray, thresh: float) -> float:
+    """Value under which the lowest `thresh` proportion of the mass lies.
+
+    Same meaning as the `thresh` of seaborn's `kdeplot`.
+    """
+    values = np.sort(heatmap, axis=None)
+    cumulative = np.cumsum(values)
+    if cumulative[-1] <= 0:
+        return 0.0
+    idx = np.searchsorted(cumulative, thresh * cumulative[-1], side="left")
+    return float(values[min(idx, len(values) - 1)])
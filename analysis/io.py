@@ -1,14 +1,38 @@
+import hashlib
+import json
+import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
+from .logger_config import logger
+
+# header of the raw trial_N.csv files (the first column is the index)
+TRIAL_COLUMNS = ["", "x", "y", "validity", "timestamp_us"]
+
+# binary trial cache written next to the raw CSVs
+CACHE_DIR_NAME = ".cache"
+TRIAL_DTYPE = np.dtype(
+    [
+        ("index", "<i8"),
+        ("x", "<f4"),
+        ("y", "<f4"),
+        ("timestamp_us", "<i8"),
+        ("validity", "u1"),  # 1: Valid, 0: Invalid
+    ]
+)
+VALIDITY_LABELS = ["Invalid", "Valid"]
+
+# sha256 of files, keyed by (path, mtime_ns, size)
+_DIGESTS: dict[tuple[str, int, int], str] = {}
+
 
 def load_path(results_root: Path) -> tuple[list[Path], list[Path]]:
     timer_subj_roots = []
     control_subj_roots = []
 
-    results_root = Path("./results/subjects")
-    for root in results_root.glob("trial_*"):
+    for root in sorted(Path(results_root).glob("trial_*")):
         if (root / "ignore_this").exists():
             continue
         if root.name.endswith("timer"):
@@ -19,5 +43,145 @@ def load_path(results_root: Path) -> tuple[list[Path], list[Path]]:
 
 
 def load_data(path: Path) -> pd.DataFrame:
-    raw_df = pd.read_csv(path, index_col=0)
+    # the trackers record float32 coordinates, parsed exactly with round-trip
+    # precision, as for the binary cache
+    raw_df = pd.read_csv(path, index_col=0, float_precision="round_trip")
+    return raw_df
+
+
+def probe_data(path: Path) -> None:
+    """Cheap metadata-only check of a trial file: size and header."""
+    if not path.exists():
+        msg = f"{path} does not exist."
+        raise ValueError(msg)
+    if path.stat().st_size == 0:
+        msg = f"{path} is empty."
+        raise ValueError(msg)
+    with path.open(encoding="utf-8") as f:
+        header = f.readline().rstrip("\r\n").split(",")
+    if header != TRIAL_COLUMNS:
+        msg = f"{path} has an unexpected header: {header}"
+        raise ValueError(msg)
+
+
+def file_digest(path: Path) -> str:
+    """sha256 of a file, memoized until its mtime or size changes."""
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    if key not in _DIGESTS:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _DIGESTS[key] = h.hexdigest()
+    return _DIGESTS[key]
+
+
+def _source_meta(path: Path) -> dict:
+    stat = path.stat()
+    return {
+        "source": path.name,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": file_digest(path),
+    }
+
+
+def _cache_paths(path: Path) -> tuple[Path, Path]:
+    cache_dir = path.parent / CACHE_DIR_NAME
+    return cache_dir / f"{path.stem}.npy", cache_dir / f"{path.stem}.json"
+
+
+def _atomic_write(path: Path, write) -> None:
+    # write next to `path` and rename, the tmp file is removed if writing fails
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            write(f)
+        tmp_path.replace(path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _read_records(path: Path) -> np.ndarray:
+    # the samples of a trial CSV as a TRIAL_DTYPE array
+    raw_df = load_data(path)
+    unknown = set(raw_df["validity"].unique()) - set(VALIDITY_LABELS)
+    if unknown:
+        msg = f"{path} has unknown validity values: {sorted(unknown)}"
+        raise ValueError(msg)
+
+    records = np.empty(len(raw_df), dtype=TRIAL_DTYPE)
+    records["index"] = raw_df.index.to_numpy()
+    records["x"] = raw_df["x"].to_numpy()
+    records["y"] = raw_df["y"].to_numpy()
+    records["timestamp_us"] = raw_df["timestamp_us"].to_numpy()
+    records["validity"] = (raw_df["validity"] == "Valid").to_numpy()
+    return records
+
+
+def convert_data(path: Path, records: np.ndarray | None = None) -> Path:
+    """Write a trial CSV once as a binary columnar (.npy) file.
+
+    The samples are stored as a structured array (float32 x/y, int64
+    timestamp_us, uint8 validity). The trackers record float32 coordinates, so
+    parsing them with round-trip precision keeps them exact.
+    """
+    if records is None:
+        records = _read_records(path)
+    cache_path, meta_path = _cache_paths(path)
+    cache_path.parent.mkdir(exist_ok=True)
+    _atomic_write(cache_path, lambda f: np.save(f, records))
+    meta = json.dumps(_source_meta(path), indent=2).encode()
+    _atomic_write(meta_path, lambda f: f.write(meta))
+    return cache_path
+
+
+def _is_fresh(path: Path, meta_path: Path) -> bool:
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    stat = path.stat()
+    if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return True
+    # the file was touched: only rebuild if its content changed
+    if meta["size"] == stat.st_size and meta["sha256"] == file_digest(path):
+        try:
+            meta_path.write_text(json.dumps(_source_meta(path), indent=2), encoding="utf-8")
+        except OSError:
+            # read-only: the digest is checked again on the next read
+            pass
+        return True
+    return False
+
+
+def load_data_cached(path: Path) -> pd.DataFrame:
+    """The samples of `load_data`, read from the memory-mapped binary cache.
+
+    The cache is (re)built when the source CSV is missing from it or changed.
+    When it cannot be written, e.g. on a read-only mount, the parsed CSV is
+    used as is. "validity" is categorical instead of strings.
+    """
+    cache_path, meta_path = _cache_paths(path)
+    if cache_path.exists() and _is_fresh(path, meta_path):
+        records = np.load(cache_path, mmap_mode="r")
+    else:
+        records = _read_records(path)
+        try:
+            convert_data(path, records)
+        except OSError as e:
+            logger.info("%s: the binary cache is not written (%s)", path, e)
+
+    raw_df = pd.DataFrame(
+        {
+            "x": records["x"].astype(np.float64),
+            "y": records["y"].astype(np.float64),
+            "validity": pd.Categorical.from_codes(
+                records["validity"].astype(np.int8), categories=VALIDITY_LABELS
+            ),
+            "timestamp_us": records["timestamp_us"].astype(np.int64),
+        },
+        index=pd.Index(records["index"].astype(np.int64)),
+    )
     return raw_df
@@ -11,20 +11,33 @@ logger.setLevel(logging.INFO)
 for handler in logger.handlers[:]:
     logger.removeHandler(handler)
 
-# ログディレクトリの作成
-log_dir = Path(__file__).parent.parent / "log"
-log_dir.mkdir(parents=True, exist_ok=True)
-
-# ログファイルの名前を実行開始の日時に設定
-log_filename = datetime.now().strftime("%Y-%m-%d_%H-%M-%S.log")
-log_filepath = log_dir / log_filename
-
-# ファイルハンドラの作成
-file_handler = logging.FileHandler(log_filepath)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-)
-
-# ロガーにファイルハンドラを追加
-logger.addHandler(file_handler)
+# デフォルトのログディレクトリ
+LOG_DIR = Path(__file__).parent.parent / "log"
+
+
+def setup_file_logging(log_dir: Path = LOG_DIR, level: int = logging.INFO) -> Path:
+    """Log to a new file named after the current time in `log_dir`.
+
+    Nothing is written to disk until this is called, e.g. at the start of a
+    notebook or script; calling it again returns the file already in use.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler):
+            return Path(handler.baseFilename)
+
+    # ログディレクトリの作成
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    # ログファイルの名前を実行開始の日時に設定
+    log_filename = datetime.now().strftime("%Y-%m-%d_%H-%M-%S.log")
+    log_filepath = log_dir / log_filename
+
+    # ファイルハンドラの作成
+    file_handler = logging.FileHandler(log_filepath)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    # ロガーにファイルハンドラを追加
+    logger.addHandler(file_handler)
+    return log_filepath
@@ -1,26 +1,62 @@
+from collections.abc import Callable, Sequence
+
 import numpy as np
 import pandas as pd
 
+from .fixations import FixationArray
+
+# columns of `calculate_metrics`
+METRIC_COLUMNS = [
+    "Average Fixation Duration (seconds)",
+    "Average Saccade Length (pixels)",
+    "Total Number of Fixations",
+    "Total Scanpath Duration (seconds)",
+]
+
+
+def _has_times(fixations: pd.DataFrame | FixationArray) -> bool:
+    return "time_start" in fixations.columns and "time_end" in fixations.columns
+
+
+def fixation_durations(fixations: pd.DataFrame | FixationArray) -> np.ndarray:
+    """Durations in seconds as float64, from the times when there are some.
 
-def calculate_metrics(df: pd.DataFrame) -> pd.DataFrame:
-    # 1. Calculate Average Fixation Duration
-    average_fixation_duration = df["duration"].mean()
+    The `duration` field of a FixationArray is only stored as float32.
+    """
+    if _has_times(fixations):
+        time_start = np.asarray(fixations["time_start"], dtype=np.float64)
+        return np.asarray(fixations["time_end"], dtype=np.float64) - time_start
+    return np.asarray(fixations["duration"], dtype=np.float64)
 
-    # 2. Calculate Saccade Lengths (distance between consecutive fixations)
-    x_diff = df["x"].diff().iloc[1:]  # Differences in x coordinates
-    y_diff = df["y"].diff().iloc[1:]  # Differences in y coordinates
-    saccade_lengths = np.sqrt(
-        x_diff**2 + y_diff**2
-    )  # Euclidean distance between consecutive fixations
 
-    # 3. Calculate the Average Saccade Length
-    average_saccade_length = saccade_lengths.mean()
+def calculate_metrics(df: pd.DataFrame | FixationArray) -> pd.DataFrame:
+    durations = fixation_durations(df)
+    xs = np.asarray(df["x"], dtype=np.float64)
+    ys = np.asarray(df["y"], dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 1. Calculate Average Fixation Duration
+        average_fixation_duration = durations.sum() / len(durations)
+
+        # 2. Calculate Saccade Lengths (distance between consecutive fixations)
+        saccade_lengths = np.sqrt(
+            np.diff(xs) ** 2 + np.diff(ys) ** 2
+        )  # Euclidean distance between consecutive fixations
+
+        # 3. Calculate the Average Saccade Length
+        average_saccade_length = saccade_lengths.sum() / len(saccade_lengths)
 
     # 4. Calculate Total Number of Fixations
-    total_fixations = len(df)
+    total_fixations = len(durations)
 
     # 5. Calculate Total Scanpath Duration
-    total_scanpath_duration = df["time_end"].max() - df["time_start"].min()
+    if _has_times(df):
+        if total_fixations:
+            total_scanpath_duration = np.max(df["time_end"]) - np.min(df["time_start"])
+        else:
+            total_scanpath_duration = np.nan
+    else:
+        # fixations without timing
+        total_scanpath_duration = np.nan
 
     # 6. Prepare metrics for display
     metrics = [
@@ -32,11 +68,161 @@ def calculate_metrics(df: pd.DataFrame) -> pd.DataFrame:
         ],
     ]
     metrics_df = pd.DataFrame(metrics)
-    metrics_df.columns = [
-        "Average Fixation Duration (seconds)",
-        "Average Saccade Length (pixels)",
-        "Total Number of Fixations",
-        "Total Scanpath Duration (seconds)",
-    ]
+    metrics_df.columns = METRIC_COLUMNS
+
+    return metrics_df
+
+
+class Segments:
+    """Fixations cut into groups, those of group k at `offsets[k] : offsets[k + 1]`.
+
+    Metrics are computed for every group at once from these, with the
+    grouped reductions below instead of a loop over the groups. Columns
+    are read as float64 when a metric first uses them.
+    """
+
+    def __init__(self, fixations: pd.DataFrame | FixationArray, offsets: np.ndarray) -> None:
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.fixations = fixations
+        self.lo = int(offsets[0]) if len(offsets) else 0
+        self.hi = int(offsets[-1]) if len(offsets) else 0
+        self.offsets = offsets - self.lo
+        self.counts = np.diff(self.offsets)
+        self.n_groups = len(self.counts)
+        # group of every fixation
+        self.ids = np.repeat(np.arange(self.n_groups), self.counts)
+        self._columns: dict[str, np.ndarray] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fixations.columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            values = np.asarray(self.fixations[name], dtype=np.float64)
+            self._columns[name] = values[self.lo : self.hi]
+        return self._columns[name]
+
+    def sum(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.ids, weights=values, minlength=self.n_groups)
+
+    def mean(self, values: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum(values) / self.counts
+
+    def reduce(self, ufunc: np.ufunc, values: np.ndarray) -> np.ndarray:
+        """`ufunc.reduceat` over every group, NaN for the empty ones."""
+        result = np.full(self.n_groups, np.nan)
+        nonempty = self.counts > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(values, self.offsets[:-1][nonempty])
+        return result
+
+    def durations(self) -> np.ndarray:
+        """Float64 durations of the fixations, see `fixation_durations`."""
+        if "time_start" in self and "time_end" in self:
+            return self["time_end"] - self["time_start"]
+        return self["duration"]
+
+    def pairs(self) -> np.ndarray:
+        """For every fixation after the first, whether the previous one is in its group."""
+        return self.ids[1:] == self.ids[:-1]
+
+
+MetricFunc = Callable[[Segments], np.ndarray]
+# metrics of `segment_metrics`, by short name
+METRICS: dict[str, MetricFunc] = {}
+
+
+def register_metric(name: str) -> Callable[[MetricFunc], MetricFunc]:
+    """Add a metric, a function of the `Segments` returning one value per group."""
+
+    def decorator(func: MetricFunc) -> MetricFunc:
+        METRICS[name] = func
+        return func
+
+    return decorator
+
+
+@register_metric("n_fix")
+def _n_fix(seg: Segments) -> np.ndarray:
+    return seg.counts
+
+
+@register_metric("mfd")
+def _mfd(seg: Segments) -> np.ndarray:
+    return seg.mean(seg.durations())
+
+
+@register_metric("sd_fd")
+def _sd_fd(seg: Segments) -> np.ndarray:
+    # sample SD (ddof=1) as pandas' std, from the deviations to the group mean
+    durations = seg.durations()
+    deviations = durations - seg.mean(durations)[seg.ids]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sd = np.sqrt(seg.sum(deviations * deviations) / (seg.counts - 1))
+    return np.where(seg.counts > 1, sd, np.nan)
+
+
+@register_metric("sac_amp")
+def _sac_amp(seg: Segments) -> np.ndarray:
+    # saccades between consecutive fixations of the same group
+    lengths = np.sqrt(np.diff(seg["x"]) ** 2 + np.diff(seg["y"]) ** 2)
+    same = seg.pairs()
+    total = np.bincount(seg.ids[1:][same], weights=lengths[same], minlength=seg.n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / np.maximum(seg.counts - 1, 0)
+
+
+@register_metric("scanpath_dur")
+def _scanpath_dur(seg: Segments) -> np.ndarray:
+    return seg.reduce(np.maximum, seg["time_end"]) - seg.reduce(np.minimum, seg["time_start"])
+
+
+# long names of the metrics shared with `calculate_metrics`
+METRIC_LABELS = {
+    "mfd": METRIC_COLUMNS[0],
+    "sac_amp": METRIC_COLUMNS[1],
+    "n_fix": METRIC_COLUMNS[2],
+    "scanpath_dur": METRIC_COLUMNS[3],
+}
+
+
+def segment_metrics(
+    fixations: pd.DataFrame | FixationArray,
+    offsets: np.ndarray,
+    names: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """Metrics of every group of fixations, one row per group.
+
+    The fixations of group k are rows `offsets[k] : offsets[k + 1]`, in time
+    order, e.g. the `fixations` and `offsets` of a `batch.RaggedFixations`.
+    `names` are keys of `METRICS` (all of them by default).
+    """
+    names = list(METRICS) if names is None else list(names)
+    seg = Segments(fixations, offsets)
+    result = {}
+    for name in names:
+        if name not in METRICS:
+            raise ValueError(f"Invalid metric: {name}")
+        result[name] = METRICS[name](seg)
+    return pd.DataFrame(result)
+
+
+def batch_metrics(
+    table: pd.DataFrame,
+    by: Sequence[str] = ("name", "trial"),
+    names: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """Metrics of every group of a long fixation table, indexed by the `by` columns.
 
+    `table` has the group columns (e.g. subject, trial and window) and the
+    fixation columns, in time order within every group. The rows are
+    grouped once and every metric is computed for all the groups at once.
+    """
+    grouper = table.groupby(list(by), sort=True, observed=True, dropna=False)
+    codes = grouper.ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=grouper.ngroups))])
+    metrics_df = segment_metrics(table.iloc[order], offsets, names)
+    metrics_df.index = grouper.size().index
     return metrics_df
@@ -1,78 +1,134 @@
 import numpy as np
 import pandas as pd
 
+from .aoi import AOIIndex, get_aoi_index
 from .consts import TIME_WINDOW, TRIAL_DURATION
-from .draw_utils import get_left_mask, get_right_mask
-from .metrics import calculate_metrics
+from .fixations import FixationArray
+from .metrics import METRIC_COLUMNS
 from .subject import Subject
 from .utils import log_ts
 
 # ----
 
 
-def _get_transitions_idx(org_df: pd.DataFrame) -> np.ndarray:
-    fix_df = org_df.copy()
-    left_mask = get_left_mask()
-    right_mask = get_right_mask()
-
-    # classify fixations to left or right
-    left_fix_cond = (
-        (fix_df["x"] >= left_mask[0][0])
-        & (fix_df["x"] <= left_mask[0][1])
-        & (fix_df["y"] >= left_mask[1][0])
-        & (fix_df["y"] <= left_mask[1][1])
+def _area_of_fixations(xs: np.ndarray, ys: np.ndarray, aoi_index: AOIIndex | None) -> np.ndarray:
+    # -1 for left, 1 for right, 0 for other
+    if aoi_index is None:
+        aoi_index = get_aoi_index()
+    labels = aoi_index.classify(xs, ys)
+    return np.where(
+        labels == aoi_index.label_of("left"),
+        -1,
+        np.where(labels == aoi_index.label_of("right"), 1, 0),
     )
 
-    right_fix_cond = (
-        (fix_df["x"] >= right_mask[0][0])
-        & (fix_df["x"] <= right_mask[0][1])
-        & (fix_df["y"] >= right_mask[1][0])
-        & (fix_df["y"] <= right_mask[1][1])
-    )
 
-    # -1 for left, 1 for right, 0 for other
-    fix_df["fixation_area"] = np.where(
-        left_fix_cond, -1, np.where(right_fix_cond, 1, 0)
-    )
+def window_bounds(
+    time_start: np.ndarray,
+    window: float = TIME_WINDOW,
+    stride: float | None = None,
+    duration: float = TRIAL_DURATION,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fixation index range [lo, hi) of every time window.
 
-    # get transition between left and right
-    transitions = fix_df["fixation_area"].diff().ne(0)
-    transitions = transitions[transitions].index.to_numpy()
-    return transitions
+    A window starting at t holds the fixations starting within [t, t + window].
+    `time_start` must be sorted. Windows overlap when `stride` < `window`.
+    """
+    if stride is None:
+        stride = window
+    starts = np.arange(0, duration, stride)
+    lo = np.searchsorted(time_start, starts, side="left")
+    hi = np.searchsorted(time_start, starts + window, side="right")
+    return starts, lo, hi
 
 
-# devide fixation dataframe with time window
 @log_ts
-def _divide_fixation_df(fix_df: pd.DataFrame, t: int) -> pd.DataFrame:
-    # divide fixation data within time window
-    min_t, max_t = t, t + TIME_WINDOW
-    divided_df = fix_df[
-        (fix_df["time_start"] >= min_t) & (fix_df["time_start"] <= max_t)
-    ]
-    return divided_df
+def calc_window_metrics(
+    fix_df: pd.DataFrame | FixationArray,
+    window: float = TIME_WINDOW,
+    stride: float | None = None,
+    duration: float = TRIAL_DURATION,
+    aoi_index: AOIIndex | None = None,
+) -> pd.DataFrame:
+    """`calculate_metrics` and the number of transitions of every time window.
+
+    Every metric is computed from prefix sums over the fixations, so all the
+    windows (overlapping or not) cost one pass over the data.
+    Returns one row per window, starting with "window_start" and "window_end".
+    """
+    order = np.argsort(np.asarray(fix_df["time_start"]), kind="stable")
+    time_start = np.asarray(fix_df["time_start"], dtype=np.float64)[order]
+    time_end = np.asarray(fix_df["time_end"], dtype=np.float64)[order]
+    durations = time_end - time_start
+    xs = np.asarray(fix_df["x"], dtype=np.float64)[order]
+    ys = np.asarray(fix_df["y"], dtype=np.float64)[order]
+
+    starts, lo, hi = window_bounds(time_start, window, stride, duration)
+    count = hi - lo
+    has_fix = count > 0
+
+    def prefix(values: np.ndarray) -> np.ndarray:
+        return np.concatenate([[0], np.cumsum(values)])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 1. Average Fixation Duration
+        cum_dur = prefix(durations)
+        mean_duration = (cum_dur[hi] - cum_dur[lo]) / count
+
+        # 2-3. Average Saccade Length, the saccade i goes from fixation i to i + 1
+        saccade_lengths = np.sqrt(np.diff(xs) ** 2 + np.diff(ys) ** 2)
+        cum_sac = prefix(saccade_lengths)
+        nb_saccades = np.maximum(count - 1, 0)
+        sac_lo = np.minimum(lo, len(saccade_lengths))
+        sac_hi = np.minimum(np.maximum(hi - 1, lo), len(saccade_lengths))
+        mean_saccade = (cum_sac[sac_hi] - cum_sac[sac_lo]) / nb_saccades
+
+    # 5. Total Scanpath Duration
+    last = np.maximum(hi - 1, 0)
+    if np.all(np.diff(time_end) >= 0):
+        end_max = time_end[last] if len(time_end) else np.zeros(len(starts))
+    else:
+        end_max = np.array([time_end[i:j].max() if j > i else np.nan for i, j in zip(lo, hi)])
+    first = np.minimum(lo, max(len(time_start) - 1, 0))
+    start_min = time_start[first] if len(time_start) else np.zeros(len(starts))
+    scanpath_duration = np.where(has_fix, end_max - start_min, np.nan)
+
+    # transitions between left and right, the first fixation counts as one
+    area = _area_of_fixations(xs, ys, aoi_index)
+    changes = np.zeros(len(area), dtype=np.int64)
+    changes[1:] = area[1:] != area[:-1]
+    cum_changes = prefix(changes)
+    inner_lo = np.minimum(lo + 1, hi)
+    transitions = has_fix.astype(np.int64) + cum_changes[hi] - cum_changes[inner_lo]
+
+    metrics_df = pd.DataFrame(
+        {
+            "window_start": starts,
+            "window_end": starts + window,
+            "Average Fixation Duration (seconds)": mean_duration,
+            "Average Saccade Length (pixels)": mean_saccade,
+            "Total Number of Fixations": count,
+            "Total Scanpath Duration (seconds)": scanpath_duration,
+            "Number of Transitions": transitions,
+        }
+    )
+    return metrics_df
 
-@log_ts
-def _calc_tr_nb_for_time_window(fix_df: pd.DataFrame, t: int):
-    # get number transitions for time window
-    divided_df = _divide_fixation_df(fix_df, t)
-    transitions = _get_transitions_idx(divided_df)
-    return transitions.shape[0]
 
 @log_ts
-def calc_transitions_trial(fix_df: pd.DataFrame):
+def calc_transitions_trial(fix_df: pd.DataFrame | FixationArray, aoi_index: AOIIndex | None = None):
     # get number transitions for each trial
-    transitions = []
-    for t in range(0, TRIAL_DURATION, TIME_WINDOW):
-        transitions.append(_calc_tr_nb_for_time_window(fix_df, t))
+    metrics_df = calc_window_metrics(fix_df, aoi_index=aoi_index)
+    transitions = metrics_df["Number of Transitions"].tolist()
     return transitions
 
 @log_ts
 def calc_mean_trans_nb(subj: Subject):
     # get mean number of transitions for all trials
     transisions = []
-    for trial_num in range(1, 5):
-        idt_df = subj.detect_fixations_idt(trial_num)
-        trans = calc_transitions_trial(idt_df)
+    ragged = subj.fixations_idt_batch(list(range(1, 5)))
+    for i in range(len(ragged)):
+        trans = calc_transitions_trial(ragged[i])
         transisions.append(trans)
     mean_transitions_nb = np.array(transisions).mean(axis=0)
     return mean_transitions_nb
@@ -80,30 +136,18 @@ def calc_mean_trans_nb(subj: Subject):
 
 # ----
 @log_ts
-def _calc_metrics_for_time_window(fix_df: pd.DataFrame, t: int):
-    min_t, max_t = t, t + TIME_WINDOW
-    divided_df = fix_df[
-        (fix_df["time_start"] >= min_t) & (fix_df["time_start"] <= max_t)
-    ]
-    metrics_df = calculate_metrics(divided_df)
-    return metrics_df
-
-
-@log_ts
-def _calc_metrics_all_time_window(fix_df: pd.DataFrame) -> pd.DataFrame:
-    metrics_df = _calc_metrics_for_time_window(fix_df, 0)
-    for t in range(TIME_WINDOW, TRIAL_DURATION, TIME_WINDOW):
-        metrics_df = pd.concat([metrics_df, _calc_metrics_for_time_window(fix_df, t)])
-    metrics_df = metrics_df.reset_index(drop=True)
+def _calc_metrics_all_time_window(fix_df: pd.DataFrame | FixationArray) -> pd.DataFrame:
+    metrics_df = calc_window_metrics(fix_df)
+    metrics_df = metrics_df[METRIC_COLUMNS]
     return metrics_df
 
 
 @log_ts
 def calc_mean_nb_of_fixes_for_time_window_all_trial(subj: Subject) -> np.ndarray:
     total_nb_of_fixes_all_trial = []
-    for i in subj.task_order:
-        fix_df = subj.detect_fixations_idt(i)
-        metrics = _calc_metrics_all_time_window(fix_df)
+    ragged = subj.fixations_idt_batch(subj.task_order)
+    for i in range(len(ragged)):
+        metrics = _calc_metrics_all_time_window(ragged[i])
         total_nb_of_fixes = metrics["Total Number of Fixations"].to_list()
         total_nb_of_fixes_all_trial.append(total_nb_of_fixes)
     return np.array(total_nb_of_fixes_all_trial).mean(axis=0)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from .consts import SCREEN_HEIGHT, SCREEN_WIDTH
@@ -23,8 +24,8 @@ def _drop_invalid(raw_df: pd.DataFrame) -> pd.DataFrame:
     invalid_mask = raw_df["validity"] == "Invalid"
     valid_df = raw_df[~invalid_mask].copy()
     valid_df = valid_df.drop(["validity"], axis=1)
-    if sum(invalid_mask) > 0:
-        logger.info("invalid: %d samples are dropped", sum(invalid_mask))
+    if np.count_nonzero(invalid_mask) > 0:
+        logger.info("invalid: %d samples are dropped", np.count_nonzero(invalid_mask))
     return valid_df
 
 
@@ -34,8 +35,8 @@ def _drop_blink_rows(valid_df: pd.DataFrame) -> pd.DataFrame:
     """
     blink_mask = (valid_df["x"] <= 0) | (valid_df["y"] <= 0)
     no_blink_df = valid_df[~blink_mask]
-    if sum(blink_mask) > 0:
-        logger.info("blink: %d samples are dropped", sum(blink_mask))
+    if np.count_nonzero(blink_mask) > 0:
+        logger.info("blink: %d samples are dropped", np.count_nonzero(blink_mask))
     return no_blink_df
 
 
@@ -44,8 +45,8 @@ def _drop_out_of_screen(no_blink_df: pd.DataFrame) -> pd.DataFrame:
     Drops rows with invalid values in the 'value' column.
     """
     out_of_scr_mask = (no_blink_df["x"] > SCREEN_WIDTH) | (no_blink_df["y"] > SCREEN_HEIGHT)
-    if sum(out_of_scr_mask) > 0:
-        logger.info("out of screen: %d samples are dropped", sum(out_of_scr_mask))
+    if np.count_nonzero(out_of_scr_mask) > 0:
+        logger.info("out of screen: %d samples are dropped", np.count_nonzero(out_of_scr_mask))
     et_df = no_blink_df[~out_of_scr_mask].copy()
     return et_df
 
@@ -78,3 +79,52 @@ def preprocess(raw_df: pd.DataFrame) -> pd.DataFrame:
     et_df = _edit_time_stamp(et_df)
 
     return et_df
+
+
+def preprocess_fused(raw_df: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, int]]:
+    """Same result as `preprocess` with a single copy of the data.
+
+    The invalid, blink and out-of-screen masks are combined in one pass and
+    applied at once. Each dropped sample is counted under the first reason
+    `preprocess` would drop it for.
+    Returns:
+    - pd.DataFrame: the same columns as `preprocess`
+    - dict: number of samples dropped per reason and kept
+    """
+    is_valid_data(raw_df)
+    xs = raw_df["x"].to_numpy()
+    ys = raw_df["y"].to_numpy()
+    invalid_mask = (raw_df["validity"] == "Invalid").to_numpy()
+    blink_mask = (xs <= 0) | (ys <= 0)
+    out_of_scr_mask = (xs > SCREEN_WIDTH) | (ys > SCREEN_HEIGHT)
+
+    dropped = invalid_mask.copy()
+    nb_invalid = np.count_nonzero(invalid_mask)
+    nb_blink = np.count_nonzero(blink_mask & ~dropped)
+    dropped |= blink_mask
+    nb_out_of_scr = np.count_nonzero(out_of_scr_mask & ~dropped)
+    dropped |= out_of_scr_mask
+
+    report = {
+        "invalid": int(nb_invalid),
+        "blink": int(nb_blink),
+        "out_of_screen": int(nb_out_of_scr),
+        "kept": int(len(dropped) - np.count_nonzero(dropped)),
+    }
+    for reason in ("invalid", "blink", "out_of_screen"):
+        if report[reason] > 0:
+            logger.info("%s: %d samples are dropped", reason.replace("_", " "), report[reason])
+
+    # the only copy of the samples
+    keep = ~dropped
+    et_df = pd.DataFrame(
+        {
+            column: raw_df[column].to_numpy()[keep]
+            for column in raw_df.columns
+            if column != "validity"
+        },
+        index=raw_df.index[keep],
+    )
+    et_df = _edit_time_stamp(et_df)
+
+    return et_df, report
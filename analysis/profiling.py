@@ -0,0 +1,304 @@
+import json
+import math
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+# latency histograms have HIST_STEPS buckets per power of two of nanoseconds
+HIST_STEPS = 4
+PERCENTILES = (50, 95, 99)
+# stages of a call path are joined with ";", as in collapsed flamegraph stacks
+PATH_SEP = ";"
+
+
+def _bucket(ns: int) -> int:
+    return int(HIST_STEPS * math.log2(ns)) if ns > 1 else 0
+
+
+def _bucket_upper(bucket: int) -> float:
+    return 2 ** ((bucket + 1) / HIST_STEPS)
+
+
+class StageStats:
+    """Timings of one call path: totals, a log-scale latency histogram and peak memory."""
+
+    __slots__ = ("count", "cpu_ns", "hist", "max_ns", "min_ns", "peak_bytes", "self_ns", "wall_ns")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.wall_ns = 0
+        self.self_ns = 0
+        self.cpu_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+        self.peak_bytes = 0
+        self.hist: dict[int, int] = {}
+
+    def add(self, wall_ns: int, self_ns: int, cpu_ns: int, peak_bytes: int = 0) -> None:
+        self.min_ns = wall_ns if self.count == 0 else min(self.min_ns, wall_ns)
+        self.max_ns = max(self.max_ns, wall_ns)
+        self.count += 1
+        self.wall_ns += wall_ns
+        self.self_ns += self_ns
+        self.cpu_ns += cpu_ns
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+        bucket = _bucket(wall_ns)
+        self.hist[bucket] = self.hist.get(bucket, 0) + 1
+
+    def merge(self, other: "StageStats") -> None:
+        if other.count == 0:
+            return
+        self.min_ns = other.min_ns if self.count == 0 else min(self.min_ns, other.min_ns)
+        self.max_ns = max(self.max_ns, other.max_ns)
+        self.count += other.count
+        self.wall_ns += other.wall_ns
+        self.self_ns += other.self_ns
+        self.cpu_ns += other.cpu_ns
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+        for bucket, n in other.hist.items():
+            self.hist[bucket] = self.hist.get(bucket, 0) + n
+
+    def percentile(self, q: float) -> float:
+        """Latency in ns under which `q` % of the calls fall, to a histogram bucket."""
+        if self.count == 0:
+            return math.nan
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.hist):
+            seen += self.hist[bucket]
+            if seen >= rank:
+                return min(max(_bucket_upper(bucket), self.min_ns), self.max_ns)
+        return float(self.max_ns)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "wall_ns": self.wall_ns,
+            "self_ns": self.self_ns,
+            "cpu_ns": self.cpu_ns,
+            "min_ns": self.min_ns,
+            "max_ns": self.max_ns,
+            "peak_bytes": self.peak_bytes,
+            "hist": {str(bucket): n for bucket, n in self.hist.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "StageStats":
+        stats = cls()
+        for name in ("count", "wall_ns", "self_ns", "cpu_ns", "min_ns", "max_ns", "peak_bytes"):
+            setattr(stats, name, values[name])
+        stats.hist = {int(bucket): n for bucket, n in values["hist"].items()}
+        return stats
+
+
+class _Frame:
+    # an open stage, its wall_ns is set when it closes
+    __slots__ = ("child_ns", "child_peak", "cpu_start", "mem_start", "name", "start", "wall_ns")
+
+    def __init__(self, name: str, start: int, cpu_start: int, mem_start: int) -> None:
+        self.name = name
+        self.start = start
+        self.cpu_start = cpu_start
+        self.mem_start = mem_start
+        self.child_ns = 0
+        self.child_peak = 0
+        self.wall_ns = 0
+
+
+class Profiler:
+    """Wall and CPU time of nested stages, keyed by their call path.
+
+    Stages are timed with `perf_counter_ns` and `thread_time_ns`; nested
+    stages are recorded under the path of their parents (e.g.
+    ("calc_mean_trans_nb", "calc_transitions_trial")), so `stats` gives both
+    the total and the self time of every node of the call tree. With
+    `trace_memory`, the `tracemalloc` peak of every stage is recorded too.
+    Each thread keeps its own stack. The tracemalloc peak is process-wide,
+    so it is only recorded for stages during which no other thread opened
+    a stage; the others record a peak of 0. Stats of other processes are
+    added with `merge(snapshot)`.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self._stats: dict[tuple[str, ...], StageStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # threads with an open stage, and how often one opened beside another
+        self._open_threads = 0
+        self._overlaps = 0
+
+    def _stack(self) -> list[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def set_trace_memory(self, trace_memory: bool) -> None:
+        """Record the tracemalloc peak of the stages (starts tracemalloc if needed)."""
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[_Frame]:
+        """Time the enclosed block as the stage `name`, nested in the current stage.
+
+        Yields the frame of the stage, whose `wall_ns` is set when the block
+        exits (also when the profiler is disabled).
+        """
+        if not self.enabled:
+            frame = _Frame(name, time.perf_counter_ns(), 0, 0)
+            try:
+                yield frame
+            finally:
+                frame.wall_ns = time.perf_counter_ns() - frame.start
+            return
+        stack = self._stack()
+        with self._lock:
+            if not stack:
+                self._open_threads += 1
+                if self._open_threads > 1:
+                    self._overlaps += 1
+            alone = self._open_threads == 1
+            overlaps = self._overlaps
+        mem_start = 0
+        tracing = self.trace_memory and alone and tracemalloc.is_tracing()
+        if tracing:
+            mem_start, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+        frame = _Frame(name, time.perf_counter_ns(), time.thread_time_ns(), mem_start)
+        stack.append(frame)
+        try:
+            yield frame
+        finally:
+            wall_ns = frame.wall_ns = time.perf_counter_ns() - frame.start
+            cpu_ns = time.thread_time_ns() - frame.cpu_start
+            path = tuple(f.name for f in stack)
+            stack.pop()
+            peak_bytes = 0
+            # the peak is not this thread's if another thread opened a stage meanwhile
+            if tracing and overlaps == self._overlaps:
+                peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+                peak_bytes = max(peak - frame.mem_start, 0)
+                if stack:
+                    stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            if stack:
+                stack[-1].child_ns += wall_ns
+            with self._lock:
+                if not stack:
+                    self._open_threads -= 1
+                stats = self._stats.get(path)
+                if stats is None:
+                    stats = self._stats[path] = StageStats()
+                stats.add(wall_ns, wall_ns - frame.child_ns, cpu_ns, peak_bytes)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self) -> dict:
+        """The stats as a JSON-compatible dict, e.g. to send back from a worker process."""
+        with self._lock:
+            return {PATH_SEP.join(path): s.to_dict() for path, s in self._stats.items()}
+
+    def merge(self, snapshot: dict) -> None:
+        """Add the stats of a `snapshot`, e.g. of a worker process."""
+        with self._lock:
+            for key, values in snapshot.items():
+                path = tuple(key.split(PATH_SEP))
+                stats = self._stats.get(path)
+                if stats is None:
+                    stats = self._stats[path] = StageStats()
+                stats.merge(StageStats.from_dict(values))
+
+    def stats(self) -> pd.DataFrame:
+        """One row per call path, in ms, with latency percentiles."""
+        rows = []
+        with self._lock:
+            items = sorted(self._stats.items())
+        for path, s in items:
+            row = {
+                "path": PATH_SEP.join(path),
+                "stage": path[-1],
+                "depth": len(path) - 1,
+                "count": s.count,
+                "total_ms": s.wall_ns / 1e6,
+                "self_ms": s.self_ns / 1e6,
+                "cpu_ms": s.cpu_ns / 1e6,
+                "mean_ms": s.wall_ns / s.count / 1e6,
+            }
+            for q in PERCENTILES:
+                row[f"p{q}_ms"] = s.percentile(q) / 1e6
+            row["max_ms"] = s.max_ns / 1e6
+            row["peak_bytes"] = s.peak_bytes
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def totals(self) -> pd.DataFrame:
+        """Stats per stage name over all its call paths (the old `TIME_STAMPS` view).
+
+        Recursive calls of a stage are counted once, at their outermost call.
+        """
+        stats_df = self.stats()
+        if stats_df.empty:
+            return stats_df
+        paths = stats_df["path"].str.split(PATH_SEP)
+        outermost = [path.index(path[-1]) == len(path) - 1 for path in paths]
+        totals = stats_df[outermost].groupby("stage")[["count", "total_ms", "self_ms", "cpu_ms"]]
+        return totals.sum().sort_values("total_ms", ascending=False)
+
+    def to_json(self, path: Path) -> None:
+        with Path(path).open("w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=1)
+
+    def to_csv(self, path: Path) -> None:
+        self.stats().to_csv(path, index=False)
+
+    def to_collapsed(self, path: Path) -> None:
+        """Self time in µs per call path, in the collapsed stack format of flamegraph.pl."""
+        with self._lock:
+            lines = [
+                f"{PATH_SEP.join(p)} {s.self_ns // 1000}" for p, s in sorted(self._stats.items())
+            ]
+        Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+# the profiler the `profiled` stages report into
+PROFILER = Profiler()
+
+
+def profiled(name: str | None = None) -> Callable:
+    """Decorator timing every call of a function as a stage of `PROFILER`."""
+
+    def decorator(func: Callable) -> Callable:
+        stage_name = name if name is not None else func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with PROFILER.stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def run_profiled(func: Callable, *args: Any, **kwargs: Any) -> tuple[Any, dict]:
+    """Call `func` with a fresh `PROFILER` and return its result and the stats snapshot.
+
+    Used in worker processes; the parent adds the snapshots with `PROFILER.merge`.
+    """
+    PROFILER.reset()
+    result = func(*args, **kwargs)
+    return result, PROFILER.snapshot()
@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .consts import RESULT_STORE_MAX_BYTES, RESULT_STORE_PATH, AlgoConsts
+from .fixations import FixationArray
+from .io import _atomic_write, file_digest
+
+# bump when a change in the package changes the stored results
+STORE_VERSION = 4
+
+
+class ResultStore:
+    """On-disk fixation results keyed by the raw trial file and the consts.
+
+    Entries are content addressed: the key is a hash of the trial file, the
+    algorithm and the JSON of its consts, so results are shared across
+    sessions and machines. Each entry is the `FIXATION_DTYPE` array saved
+    with `np.save` and read without unpickling, so a shared store cannot run
+    code in its readers. The least recently used entries are evicted once
+    the store grows over `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        root: Path = RESULT_STORE_PATH,
+        max_bytes: int = RESULT_STORE_MAX_BYTES,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        # running size of the entries, scanned on the first write
+        self._nbytes: int | None = None
+
+    def key(self, path: Path, algo: str, consts: AlgoConsts) -> str:
+        h = hashlib.sha256()
+        for part in (str(STORE_VERSION), file_digest(path), algo, consts.to_json()):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npy"
+
+    def _entries(self) -> list[Path]:
+        # the pickles of older versions are only left to be evicted
+        return [*self.root.glob("*/*.npy"), *self.root.glob("*/*.pkl")]
+
+    def get(self, key: str) -> FixationArray | None:
+        path = self._entry_path(key)
+        try:
+            fixations = FixationArray(np.load(path, allow_pickle=False))
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # not a fixation array, e.g. a truncated or foreign file
+            return None
+        # mark as recently used
+        os.utime(path)
+        return fixations
+
+    def put(self, key: str, fixations: pd.DataFrame | FixationArray) -> None:
+        """Write an entry, evicting old ones only when the store is over `max_bytes`.
+
+        The size of the store is kept as a running total, so entries written by
+        other processes are only counted at the next `prune`.
+        """
+        if isinstance(fixations, pd.DataFrame):
+            fixations = FixationArray.from_frame(fixations)
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self._nbytes is None:
+            self._nbytes = self.stats()["nbytes"]
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        _atomic_write(path, lambda f: np.save(f, fixations.data))
+        self._nbytes += path.stat().st_size - old_size
+        if self._nbytes > self.max_bytes:
+            self.prune()
+
+    def prune(self, max_bytes: int | None = None) -> int:
+        """Evict the least recently used entries down to `max_bytes`.
+
+        Returns the number of evicted entries.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            n_evicted += 1
+        self._nbytes = total
+        return n_evicted
+
+    def clear(self) -> int:
+        return self.prune(0)
+
+    def stats(self) -> dict[str, int]:
+        sizes = []
+        for path in self._entries():
+            try:
+                sizes.append(path.stat().st_size)
+            except FileNotFoundError:
+                continue
+        return {"entries": len(sizes), "nbytes": sum(sizes), "max_bytes": self.max_bytes}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m analysis store", description="Manage the fixation result store."
+    )
+    parser.add_argument("--root", type=Path, default=RESULT_STORE_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prune_parser = subparsers.add_parser("prune", help="evict entries down to a size")
+    prune_parser.add_argument("--max-bytes", type=int, default=RESULT_STORE_MAX_BYTES)
+    subparsers.add_parser("clear", help="remove every entry")
+    subparsers.add_parser("stats", help="show the number and size of entries")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.root)
+    if args.command == "prune":
+        print(f"evicted {store.prune(args.max_bytes)} entries")
+    elif args.command == "clear":
+        print(f"evicted {store.clear()} entries")
+    else:
+        print(store.stats())
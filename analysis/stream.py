@@ -0,0 +1,449 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .consts import SCREEN_HEIGHT, SCREEN_WIDTH, IDTConsts, SMTConsts
+from .fixations import FIXATION_COLUMNS, FixationArray, FixationBuffer
+from .IDT import _push
+from .io import load_data, load_data_cached
+from .SMT import calc_vel
+
+# one emitted fixation or saccade, with a "type" key
+Event = dict
+# samples the online I-DT buffer holds before it first grows
+INITIAL_CAPACITY = 1024
+
+
+class StreamingPreprocessor:
+    """Row-wise `preprocess` for raw samples arriving in chunks.
+
+    Takes chunks in the trial_N.csv schema and returns the kept samples as
+    (elapsed_time_s, x, y) rows, the layout the detectors take.
+    """
+
+    def __init__(self) -> None:
+        self.start_time: float | None = None
+        self.last_timestamp_us: int | None = None
+        self.report = {"invalid": 0, "blink": 0, "out_of_screen": 0, "kept": 0}
+
+    def push(self, raw_df: pd.DataFrame) -> np.ndarray:
+        timestamps_us = raw_df["timestamp_us"].to_numpy()
+        if len(timestamps_us) == 0:
+            return np.empty((0, 3))
+        if np.any(np.diff(timestamps_us) < 0) or (
+            self.last_timestamp_us is not None and timestamps_us[0] < self.last_timestamp_us
+        ):
+            msg = "The timestamps are not in increasing order."
+            raise ValueError(msg)
+        self.last_timestamp_us = timestamps_us[-1]
+
+        xs = raw_df["x"].to_numpy()
+        ys = raw_df["y"].to_numpy()
+        invalid_mask = (raw_df["validity"] == "Invalid").to_numpy()
+        blink_mask = (xs <= 0) | (ys <= 0)
+        out_of_scr_mask = (xs > SCREEN_WIDTH) | (ys > SCREEN_HEIGHT)
+        self.report["invalid"] += int(np.count_nonzero(invalid_mask))
+        self.report["blink"] += int(np.count_nonzero(blink_mask & ~invalid_mask))
+        self.report["out_of_screen"] += int(
+            np.count_nonzero(out_of_scr_mask & ~(invalid_mask | blink_mask))
+        )
+        keep = ~(invalid_mask | blink_mask | out_of_scr_mask)
+        self.report["kept"] += int(np.count_nonzero(keep))
+        if not keep.any():
+            return np.empty((0, 3))
+
+        timestamps_s = timestamps_us[keep] * 1e-6
+        if self.start_time is None:
+            self.start_time = timestamps_s[0]
+        points = np.column_stack([timestamps_s - self.start_time, xs[keep], ys[keep]])
+        return points
+
+
+class _StreamingDetector(ABC):
+    @abstractmethod
+    def push(self, points: np.ndarray) -> list[Event]:
+        """Take the next (elapsed_time_s, x, y) samples and return the new events."""
+
+    def flush(self) -> list[Event]:
+        return []
+
+    async def aiter_events(self, chunks: AsyncIterable[np.ndarray]) -> AsyncIterator[Event]:
+        """Consume preprocessed chunks and yield the events as they are detected."""
+        async for points in chunks:
+            for event in self.push(points):
+                yield event
+        for event in self.flush():
+            yield event
+
+
+class StreamingIDT(_StreamingDetector):
+    """Online I-DT over samples pushed in chunks.
+
+    Runs the same steps as `IDT.detect_fixations_deque` and only keeps the
+    samples of the current window. Fixations are emitted as soon as their
+    window closes; like the batch detector, the last open window is dropped.
+    They are also collected in `fixations`.
+    """
+
+    def __init__(self, idt_consts: IDTConsts) -> None:
+        self.t_disp = idt_consts.T_disp
+        self.t_dur = idt_consts.T_dur
+        # the samples from the window start on, in the first `_len` rows
+        self._points = np.empty((INITIAL_CAPACITY, 3))
+        self._len = 0
+        self._offset = 0  # index of self._points[0] in the stream
+        self._start = 0
+        self._end = 0
+        self._pushed = -1
+        self._queues = [deque() for _ in range(4)]
+        self.n_samples = 0
+        self.fixations = FixationBuffer()
+
+    def _append(self, points: np.ndarray) -> None:
+        n_new = len(points)
+        if self._len + n_new > len(self._points):
+            # drop the samples before the window, and grow the buffer so that
+            # it is at most half full: each sample is moved O(1) times
+            drop = self._start - self._offset
+            n_kept = self._len - drop
+            capacity = len(self._points)
+            while 2 * (n_kept + n_new) > capacity:
+                capacity *= 2
+            buffer = self._points if capacity == len(self._points) else np.empty((capacity, 3))
+            buffer[:n_kept] = self._points[drop : self._len]
+            self._points = buffer
+            self._len = n_kept
+            self._offset = self._start
+            # the queues hold indexes local to self._points
+            for q in self._queues:
+                for i in range(len(q)):
+                    q[i] -= drop
+        self._points[self._len : self._len + n_new] = points
+        self._len += n_new
+
+    def push(self, points: np.ndarray) -> list[Event]:
+        self._append(points)
+        self.n_samples += len(points)
+
+        times = self._points[: self._len, 0]
+        xs = self._points[: self._len, 1]
+        ys = self._points[: self._len, 2]
+        offset = self._offset
+        x_max_q, x_min_q, y_max_q, y_min_q = self._queues
+        queues = ((x_max_q, xs, True), (x_min_q, xs, False), (y_max_q, ys, True), (y_min_q, ys, False))
+
+        events = []
+        start, end = self._start - offset, self._end - offset
+        n_points = self._len
+        while end < n_points:
+            if self._pushed < end + offset:
+                for q, values, is_max in queues:
+                    _push(q, values, end, is_max)
+                self._pushed = end + offset
+            for q, _, _ in queues:
+                while q[0] < start:
+                    q.popleft()
+
+            dispersion = (xs[x_max_q[0]] - xs[x_min_q[0]]) + (ys[y_max_q[0]] - ys[y_min_q[0]])
+            if dispersion <= self.t_disp:
+                duration = times[end] - times[start]
+                if duration <= self.t_dur:
+                    end += 1
+                else:
+                    fixation_start = times[start]
+                    fixation_end = times[end - 1]
+                    event = {
+                        "type": "fixation",
+                        "x": np.mean(xs[start : end + 1]),
+                        "y": np.mean(ys[start : end + 1]),
+                        "time_start": fixation_start,
+                        "time_end": fixation_end,
+                        "duration": fixation_end - fixation_start,
+                        "dispersion": dispersion,
+                    }
+                    self.fixations.append(*(event[name] for name in FIXATION_COLUMNS))
+                    events.append(event)
+                    start = end
+            else:
+                start += 1
+                end = max(end, start)
+
+        self._start, self._end = start + offset, end + offset
+        return events
+
+
+class StreamingSMT(_StreamingDetector):
+    """Online SMT over samples pushed in chunks.
+
+    A velocity run over the threshold is classified once it closes, and a
+    sample's label is final once no later saccade can cover it. Fixations
+    (the records of `SMT.convert_data_into_fixations`) and saccades are
+    emitted as soon as their label runs end.
+    """
+
+    def __init__(self, smt_consts: SMTConsts) -> None:
+        self.consts = smt_consts
+        # samples (elapsed_time_s, x, y) and labels not final yet
+        self._points = np.empty((0, 3))
+        self._labels = np.empty(0, dtype=np.uint8)
+        self._offset = 0
+        # velocities of the open run over the threshold
+        self._vel = np.empty(0)
+        self._run_start: int | None = None
+        # open label run: label, first index, sample count and running aggregates
+        self._label_run: dict | None = None
+        self.n_samples = 0
+        self.fixations = FixationBuffer()
+
+    def _velocity(self, points: np.ndarray) -> np.ndarray:
+        df = pd.DataFrame(points, columns=["elapsed_time_s", "x", "y"])
+        return calc_vel(df, self.consts.DIST_EYE2DISP, self.consts.USE_ANG_VELO)
+
+    def _close_run(self, run_end: int) -> None:
+        # the velocity run [self._run_start, run_end) is over
+        start = self._run_start
+        length = run_end - start - 1
+        self._run_start = None
+        if length < 1:
+            return
+        run_vel = self._vel[:length]
+        max_index = start + int(np.argmax(run_vel))
+        center = start + length / 2
+        width = self.consts.WIDTH
+        if not (max_index >= center - width and max_index <= center + width):
+            return
+        # paint the saccade over the samples within its time range
+        times = self._points[:, 0]
+        start_time = times[start - self._offset]
+        end_time = times[start + length - self._offset]
+        lo = np.searchsorted(times, start_time, side="left")
+        hi = np.searchsorted(times, end_time, side="right")
+        self._labels[lo:hi] = 1
+
+    def _emit_final(self, n_final: int) -> list[Event]:
+        # emit the label runs closed within the first n_final buffered samples
+        events = []
+        labels = self._labels[:n_final]
+        if len(labels) == 0:
+            return events
+        heads = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+        bounds = [0, *heads.tolist(), len(labels)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            label = int(labels[lo])
+            if self._label_run is not None and self._label_run["label"] != label:
+                events.append(self._run_event())
+                self._label_run = None
+            self._extend_run(label, lo, hi)
+        return events
+
+    def _extend_run(self, label: int, lo: int, hi: int) -> None:
+        # add the buffered samples [lo, hi) to the open label run
+        segment = self._points[lo:hi]
+        xs = segment[:, 1]
+        ys = segment[:, 2]
+        run = self._label_run
+        if run is None:
+            run = self._label_run = {
+                "label": label,
+                "first": lo + self._offset,
+                "n": 0,
+                "time_start": segment[0, 0],
+                "sum_x": 0.0,
+                "sum_y": 0.0,
+                "x_min": np.inf,
+                "x_max": -np.inf,
+                "y_min": np.inf,
+                "y_max": -np.inf,
+            }
+        run["n"] += hi - lo
+        run["time_end"] = segment[-1, 0]
+        run["sum_x"] += xs.sum()
+        run["sum_y"] += ys.sum()
+        run["x_min"] = min(run["x_min"], xs.min())
+        run["x_max"] = max(run["x_max"], xs.max())
+        run["y_min"] = min(run["y_min"], ys.min())
+        run["y_max"] = max(run["y_max"], ys.max())
+
+    def _run_event(self) -> Event:
+        run = self._label_run
+        if run["label"] == 0:
+            event = {
+                "type": "fixation",
+                "x": run["sum_x"] / run["n"],
+                "y": run["sum_y"] / run["n"],
+                "time_start": run["time_start"],
+                "time_end": run["time_end"],
+                "duration": run["time_end"] - run["time_start"],
+                "dispersion": (run["x_max"] - run["x_min"]) + (run["y_max"] - run["y_min"]),
+            }
+            self.fixations.append(*(event[name] for name in FIXATION_COLUMNS))
+            return event
+        return {
+            "type": "saccade",
+            "index_start": run["first"],
+            "index_end": run["first"] + run["n"] - 1,
+            "time_start": run["time_start"],
+            "time_end": run["time_end"],
+        }
+
+    def _trim(self, n_final: int) -> None:
+        self._points = self._points[n_final:]
+        self._labels = self._labels[n_final:]
+        self._offset += n_final
+
+    def push(self, points: np.ndarray) -> list[Event]:
+        if len(points) == 0:
+            return []
+        n_old = self.n_samples
+        self.n_samples += len(points)
+        self._points = np.concatenate([self._points, points])
+        self._labels = np.concatenate([self._labels, np.zeros(len(points), dtype=np.uint8)])
+
+        # velocities from the previous last sample to the new ones
+        first = max(n_old - 1, 0)
+        velocity = self._velocity(self._points[first - self._offset :])
+        above = velocity > self.consts.THRESHOLD
+        switches = np.flatnonzero(above[1:] != above[:-1]) + 1
+        bounds = [0, *switches.tolist(), len(above)] if len(above) else [0]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            vel_start = first + lo
+            if above[lo]:
+                if self._run_start is None:
+                    self._run_start = vel_start
+                    self._vel = velocity[lo:hi]
+                else:
+                    self._vel = np.concatenate([self._vel, velocity[lo:hi]])
+            elif self._run_start is not None:
+                self._close_run(vel_start)
+        if self._run_start is None:
+            self._vel = np.empty(0)
+
+        # later saccades start at the open run, or at the last sample at the earliest
+        earliest = self._run_start if self._run_start is not None else self.n_samples - 1
+        times = self._points[:, 0]
+        n_final = int(np.searchsorted(times, times[earliest - self._offset], side="left"))
+        events = self._emit_final(n_final)
+        self._trim(n_final)
+        return events
+
+    def flush(self) -> list[Event]:
+        if self._run_start is not None:
+            self._close_run(self.n_samples - 1)
+        events = self._emit_final(len(self._labels))
+        self._trim(len(self._labels))
+        if self._label_run is not None:
+            events.append(self._run_event())
+            self._label_run = None
+        return events
+
+
+def replay_trial(
+    path: Path,
+    chunk_size: int = 16,
+    speed: float | None = 1.0,
+    use_binary_cache: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """Yield the raw samples of a trial_N.csv in chunks.
+
+    `speed` is the replay speed relative to the recording (1.0 for real time);
+    None replays as fast as possible. The samples are read like
+    `Subject.load_data` reads them, so the detections match the batch ones.
+    """
+    raw_df = load_data_cached(path) if use_binary_cache else load_data(path)
+    timestamps_s = raw_df["timestamp_us"].to_numpy() * 1e-6
+    t0 = time.perf_counter()
+    for lo in range(0, len(raw_df), chunk_size):
+        chunk = raw_df.iloc[lo : lo + chunk_size]
+        if speed is not None:
+            # wait until the last sample of the chunk is recorded
+            due = (timestamps_s[len(chunk) + lo - 1] - timestamps_s[0]) / speed
+            delay = due - (time.perf_counter() - t0)
+            if delay > 0:
+                time.sleep(delay)
+        yield chunk
+
+
+async def areplay_trial(
+    path: Path,
+    chunk_size: int = 16,
+    speed: float | None = 1.0,
+    use_binary_cache: bool = True,
+) -> AsyncIterator[pd.DataFrame]:
+    """Async version of `replay_trial`."""
+    raw_df = load_data_cached(path) if use_binary_cache else load_data(path)
+    timestamps_s = raw_df["timestamp_us"].to_numpy() * 1e-6
+    t0 = time.perf_counter()
+    for lo in range(0, len(raw_df), chunk_size):
+        chunk = raw_df.iloc[lo : lo + chunk_size]
+        if speed is not None:
+            due = (timestamps_s[len(chunk) + lo - 1] - timestamps_s[0]) / speed
+            delay = due - (time.perf_counter() - t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+        yield chunk
+
+
+def _latency_report(latencies_ns: list[int], n_samples: list[int]) -> dict:
+    latencies_us = np.array(latencies_ns, dtype=np.float64) / 1e3
+    per_sample_us = latencies_us / np.maximum(np.array(n_samples), 1)
+    total_s = latencies_us.sum() / 1e6
+    return {
+        "n_chunks": len(latencies_us),
+        "n_samples": int(np.sum(n_samples)),
+        "chunk_latency_us_mean": latencies_us.mean() if len(latencies_us) else np.nan,
+        "chunk_latency_us_p50": np.percentile(latencies_us, 50) if len(latencies_us) else np.nan,
+        "chunk_latency_us_p95": np.percentile(latencies_us, 95) if len(latencies_us) else np.nan,
+        "chunk_latency_us_p99": np.percentile(latencies_us, 99) if len(latencies_us) else np.nan,
+        "chunk_latency_us_max": latencies_us.max() if len(latencies_us) else np.nan,
+        "sample_latency_us_mean": per_sample_us.mean() if len(latencies_us) else np.nan,
+        "throughput_samples_per_s": np.sum(n_samples) / total_s if total_s > 0 else np.nan,
+    }
+
+
+def run_stream(detector, chunks: Iterable[pd.DataFrame]) -> tuple[list[Event], dict]:
+    """Feed raw chunks through preprocessing and a detector.
+
+    Returns the emitted events and a report of the processing latency per
+    chunk/sample and the throughput (waiting for the source is excluded).
+    """
+    preprocessor = StreamingPreprocessor()
+    events = []
+    latencies_ns = []
+    n_samples = []
+    for raw_df in chunks:
+        t0 = time.perf_counter_ns()
+        events.extend(detector.push(preprocessor.push(raw_df)))
+        latencies_ns.append(time.perf_counter_ns() - t0)
+        n_samples.append(len(raw_df))
+    events.extend(detector.flush())
+    return events, _latency_report(latencies_ns, n_samples)
+
+
+async def arun_stream(detector, chunks: AsyncIterable[pd.DataFrame]) -> tuple[list[Event], dict]:
+    """Async version of `run_stream`."""
+    preprocessor = StreamingPreprocessor()
+    events = []
+    latencies_ns = []
+    n_samples = []
+    async for raw_df in chunks:
+        t0 = time.perf_counter_ns()
+        events.extend(detector.push(preprocessor.push(raw_df)))
+        latencies_ns.append(time.perf_counter_ns() - t0)
+        n_samples.append(len(raw_df))
+    events.extend(detector.flush())
+    return events, _latency_report(latencies_ns, n_samples)
+
+
+def fixations_to_frame(events: list[Event]) -> pd.DataFrame:
+    """Fixation events as the DataFrame of the batch detectors."""
+    fixations = [event for event in events if event["type"] == "fixation"]
+    records = [[event[name] for name in FIXATION_COLUMNS] for event in fixations]
+    return FixationArray.from_records(records).to_frame()
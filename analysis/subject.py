@@ -1,23 +1,38 @@
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
+import numpy as np
 import pandas as pd
-from PIL import Image
 
-from .consts import IDTConsts, SMTConsts
-from .draw import plot_fixations, plot_scanpath, plot_trial, plot_trial_heatmap
+from .batch import RaggedFixations, SampleBatch, detect_fixations_idt_batch
+from .cache import LRUCache
+from .consts import CACHE_MAX_BYTES, AlgoConsts, IDTConsts, SMTConsts
+from .fixations import FixationArray, FixationBuffer
 from .IDT import detect_fixations as detect_fixations_idt
-from .io import load_data
-from .preprocess import preprocess
-from .SMT import convert_data_into_fixations
+from .io import load_data, load_data_cached, probe_data
+from .preprocess import preprocess_fused
+from .SMT import calc_vel, convert_data_into_fixations
 from .SMT import detect_fixations as detect_fixations_smt
+from .store import ResultStore
 from .utils import log_ts
 
+# plotting modules are imported by the plot methods, headless runs never load them
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from PIL import Image
+
 AlgoType = Literal["IDT", "SMT"]
 
 
+def _load_trial(path: Path, use_binary_cache: bool = True) -> pd.DataFrame:
+    df = load_data_cached(path) if use_binary_cache else load_data(path)
+    df, _report = preprocess_fused(df)
+    return df
+
+
 class Subject:
     def __init__(
         self,
@@ -25,9 +40,20 @@ class Subject:
         idt_consts: IDTConsts = IDTConsts(),
         smt_consts: SMTConsts = SMTConsts(),
         valid_exp: bool = True,
+        cache_max_bytes: int = CACHE_MAX_BYTES,
+        lazy: bool = False,
+        use_binary_cache: bool = True,
+        result_store: ResultStore | None = None,
     ) -> None:
         self.root = root
         self.valid_exp = valid_exp
+        # read trials through the binary cache next to the CSVs
+        self.use_binary_cache = use_binary_cache
+
+        # preprocessed trials and fixation results
+        self.cache = LRUCache(cache_max_bytes)
+        # fixation results persisted across sessions
+        self.result_store = result_store
 
         # constants
         self.idt_consts = idt_consts
@@ -51,7 +77,9 @@ class Subject:
         self.timestamp = datetime.fromtimestamp(timestamp)
 
         self.all_trials = [0, 1, 2, 3, 4]
-        self.valid_all()
+        # lazy subjects validate each trial when it is first loaded
+        if not lazy:
+            self.valid_all()
 
     def trial_num_to_task_id(self, order: int) -> int:
         return self.task_order[order]
@@ -59,10 +87,43 @@ class Subject:
     def task_id_to_trial_num(self, trial_num: int) -> int:
         return self.task_order.index(trial_num)
 
+    def trial_path(self, trial_num: int) -> Path:
+        return self.root / f"trial_{trial_num}.csv"
+
     def valid_all(self) -> None:
         for trial_num in self.all_trials:
             self.load_data(trial_num)
 
+    def probe_all(self) -> None:
+        """Check only the size and the header of every trial file."""
+        for trial_num in self.all_trials:
+            probe_data(self.trial_path(trial_num))
+
+    def validate(self, max_workers: int | None = None) -> None:
+        """Fully load and preprocess every trial across a process pool.
+
+        The preprocessed trials are kept in the cache.
+        """
+        paths = [self.trial_path(trial_num) for trial_num in self.all_trials]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_load_trial, path, self.use_binary_cache) for path in paths
+            ]
+            for trial_num, path, future in zip(self.all_trials, paths, futures):
+                try:
+                    df = future.result()
+                except ValueError as e:
+                    msg = f"{path}: {e}"
+                    raise ValueError(msg) from e
+                self.cache.put(("data", trial_num), df)
+
+    def invalidate_cache(self, trial_num: int | None = None) -> None:
+        """Drop the cached data and fixations of a trial, or of all trials."""
+        if trial_num is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate_where(lambda key: key[1] == trial_num)
+
     def __repr__(self) -> str:
         repr_str = f"Subject(name={self.name}, timestamp={self.timestamp}, with_timer={self.with_timer})"
         return repr_str
@@ -79,44 +140,163 @@ class Subject:
             - elapsed_time_s: elapsed time in seconds.
 
         """
-        filename = f"trial_{trial_num}.csv"
-        path = self.root / filename
-        df = load_data(path)
-        df = preprocess(df)
+        return self._cached_data(trial_num).copy()
+
+    def _cached_data(self, trial_num: int) -> pd.DataFrame:
+        # the cached frame itself, with a single cache lookup; do not modify it
+        key = ("data", trial_num)
+        df = self.cache.get(key)
+        if df is None:
+            df = _load_trial(self.trial_path(trial_num), self.use_binary_cache)
+            self.cache.put(key, df)
         return df
 
-    def load_image(self, trial_num: int) -> Image.Image:
+    def trial_points(self, trial_num: int) -> np.ndarray:
+        """The (elapsed_time_s, x, y) samples of a trial, the detectors' input."""
+        return self._cached_data(trial_num)[["elapsed_time_s", "x", "y"]].to_numpy()
+
+    def load_image(self, trial_num: int) -> "Image.Image":
+        from PIL import Image  # noqa: PLC0415
+
         # load image
         img_id = self.task_order[trial_num]
         img_path = f"./images/Trial{img_id}.png"
         img = Image.open(img_path)
         return img
 
-    @log_ts
-    def detect_fixations_idt(self, trial_num: int) -> pd.DataFrame:
-        # detect fixations using IDT
-        df = self.load_data(trial_num)
-        points = df[["elapsed_time_s", "x", "y"]].values
-        fixations = detect_fixations_idt(points, idt_consts=self.idt_consts)
-        fixation_df = pd.DataFrame(
-            fixations, columns=["x", "y", "time_start", "time_end", "duration"]
-        )
-        return fixation_df
+    def load_background(self, trial_num: int) -> np.ndarray:
+        # decoded image of the task, shared across subjects and plots
+        img_id = self.task_order[trial_num]
+        from .draw import load_background  # noqa: PLC0415
 
-    @log_ts
-    def detect_fixations_smt(self, trial_num: int) -> pd.DataFrame:
-        # detect fixations using SMT
+        return load_background(f"./images/Trial{img_id}.png")
+
+    def calc_velocity(self, trial_num: int, smt_consts: SMTConsts | None = None) -> np.ndarray:
+        """Velocity between consecutive samples of a trial, as used by SMT.
+
+        Cached per trial and geometry (USE_ANG_VELO, DIST_EYE2DISP), so SMT
+        runs with other thresholds or widths, sweeps and plots share it.
+        The array is read-only.
+        """
+        consts = smt_consts if smt_consts is not None else self.smt_consts
+        key = ("velocity", trial_num, consts.USE_ANG_VELO, consts.DIST_EYE2DISP)
+        velocity = self.cache.get(key)
+        if velocity is None:
+            df = self.load_data(trial_num)
+            velocity = calc_vel(df, consts.DIST_EYE2DISP, consts.USE_ANG_VELO)
+            velocity.flags.writeable = False
+            self.cache.put(key, velocity)
+        return velocity
+
+    def _lookup(self, algo: AlgoType, trial_num: int, consts: AlgoConsts):
+        # look up the fixations in the memory cache, then in the result store
+        key = (algo, trial_num, consts.cache_key())
+        fixations = self.cache.get(key)
+        if fixations is not None:
+            return fixations, None
+
+        store_key = None
+        if self.result_store is not None:
+            store_key = self.result_store.key(self.trial_path(trial_num), algo, consts)
+            fixations = self.result_store.get(store_key)
+            if fixations is not None:
+                fixations = self._remember(algo, trial_num, consts, None, fixations)
+        return fixations, store_key
+
+    def _remember(
+        self,
+        algo: AlgoType,
+        trial_num: int,
+        consts: AlgoConsts,
+        store_key: str | None,
+        fixations,
+    ):
+        if store_key is not None:
+            self.result_store.put(store_key, fixations)
+        if isinstance(fixations, FixationArray):
+            # shared with every caller
+            fixations = fixations.readonly()
+        self.cache.put((algo, trial_num, consts.cache_key()), fixations)
+        return fixations
+
+    def _load_or_compute(
+        self,
+        algo: AlgoType,
+        trial_num: int,
+        consts: AlgoConsts,
+        compute,
+    ):
+        fixations, store_key = self._lookup(algo, trial_num, consts)
+        if fixations is None:
+            fixations = self._remember(algo, trial_num, consts, store_key, compute(trial_num))
+        return fixations
+
+    def _compute_fixations_idt(self, trial_num: int) -> FixationArray:
+        points = self.trial_points(trial_num)
+        return detect_fixations_idt(points, idt_consts=self.idt_consts)
+
+    def _compute_fixations_smt(self, trial_num: int) -> FixationArray:
         df = self.load_data(trial_num)
         df = df[["elapsed_time_s", "x", "y"]]
         fixations_labels = detect_fixations_smt(
             df,
             smt_consts=self.smt_consts,
             plot=False,
+            velocity=self.calc_velocity(trial_num),
         )
         fixation_df = convert_data_into_fixations(fixations_labels)
-
         return fixation_df
 
+    def fixations_idt(self, trial_num: int) -> FixationArray:
+        # IDT fixations shared with the cache, read-only
+        return self._load_or_compute(
+            "IDT", trial_num, self.idt_consts, self._compute_fixations_idt
+        )
+
+    def fixations_smt(self, trial_num: int) -> FixationArray:
+        # SMT fixations shared with the cache, read-only
+        return self._load_or_compute(
+            "SMT", trial_num, self.smt_consts, self._compute_fixations_smt
+        )
+
+    @log_ts
+    def fixations_idt_batch(self, trials: list[int] | None = None) -> RaggedFixations:
+        """IDT fixations of several trials (all by default) in one array.
+
+        The trials that are not cached are detected together in one batch.
+        """
+        trials = list(self.all_trials if trials is None else trials)
+        found = {
+            trial_num: self._lookup("IDT", trial_num, self.idt_consts) for trial_num in trials
+        }
+        missing = [trial_num for trial_num, (fixations, _) in found.items() if fixations is None]
+        if missing:
+            batch = SampleBatch.from_subjects([self], missing)
+            ragged = detect_fixations_idt_batch(batch, self.idt_consts)
+            for i, trial_num in enumerate(missing):
+                fixations = FixationArray(ragged[i].data.copy())
+                store_key = found[trial_num][1]
+                fixations = self._remember("IDT", trial_num, self.idt_consts, store_key, fixations)
+                found[trial_num] = (fixations, store_key)
+
+        out = FixationBuffer(sum(len(found[trial_num][0]) for trial_num in trials))
+        offsets = [0]
+        for trial_num in trials:
+            out.extend(found[trial_num][0])
+            offsets.append(len(out))
+        keys = [(self.root, trial_num) for trial_num in trials]
+        return RaggedFixations(out.view(), np.array(offsets, dtype=np.int64), keys)
+
+    @log_ts
+    def detect_fixations_idt(self, trial_num: int) -> pd.DataFrame:
+        # detect fixations using IDT
+        return self.fixations_idt(trial_num).to_frame()
+
+    @log_ts
+    def detect_fixations_smt(self, trial_num: int) -> pd.DataFrame:
+        # detect fixations using SMT
+        return self.fixations_smt(trial_num).to_frame()
+
     def _get_title_base(self, trial_num: int) -> str:
         title = f"Subject: {self.name}, Trial {trial_num}"
         if self.with_timer:
@@ -125,42 +305,60 @@ class Subject:
             title += ", without timer"
         return title
 
-    def plot_trial(self, trial_num: int) -> None:
+    def plot_trial(self, trial_num: int, ax: "Axes | None" = None) -> None:
         df = self.load_data(trial_num)
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         title = f"{title} (Raw)"
-        plot_trial(df, img, title)
+        from .draw import plot_trial  # noqa: PLC0415
 
-    def plot_trial_heatmap(self, trial_num: int) -> None:
+        plot_trial(df, img, title, ax=ax)
+
+    def plot_trial_heatmap(self, trial_num: int, ax: "Axes | None" = None) -> None:
         df = self.load_data(trial_num)
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         title = f"{title} (Heatmap)"
-        plot_trial_heatmap(df, img, title)
+        from .draw import plot_trial_heatmap  # noqa: PLC0415
+
+        plot_trial_heatmap(df, img, title, ax=ax)
 
     def plot_fixations_idt(self, trial_num: int) -> pd.DataFrame:
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         fix_df = self.detect_fixations_idt(trial_num)
         title = f"{title} (IDT)"
+        from .draw import plot_fixations  # noqa: PLC0415
+
         plot_fixations(fix_df, img, title)
         return fix_df
 
-    def plot_fixations(self, trial_num: int, algorithm: AlgoType) -> pd.DataFrame:
+    def plot_fixations(
+        self, trial_num: int, algorithm: AlgoType, ax: "Axes | None" = None
+    ) -> pd.DataFrame:
         if algorithm == "IDT":
             fix_df = self.detect_fixations_idt(trial_num)
         elif algorithm == "SMT":
             fix_df = self.detect_fixations_smt(trial_num)
         else:
             raise ValueError(f"Invalid algorithm: {algorithm}")
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         title = "Fixations of " + title + f" ({algorithm})"
-        plot_fixations(fix_df, img, title)
+        from .draw import plot_fixations  # noqa: PLC0415
+
+        plot_fixations(fix_df, img, title, ax=ax)
         return fix_df
 
-    def plot_scanpath(self, trial_num: int, algo: AlgoType) -> pd.DataFrame:
+    def plot_scanpath(
+        self,
+        trial_num: int,
+        algo: AlgoType,
+        ax: "Axes | None" = None,
+        save_path: Path | None = None,
+        color_by_time: bool = False,
+        arrows: bool = False,
+    ) -> pd.DataFrame:
         if algo == "IDT":
             fix_df = self.detect_fixations_idt(trial_num)
         elif algo == "SMT":
@@ -168,15 +366,27 @@ class Subject:
         else:
             raise ValueError(f"Invalid algorithm: {algo}")
 
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         title = "Scanpath of " + title + f" ({algo})"
-        plot_scanpath(fix_df, img, title)
+        from .draw import plot_scanpath  # noqa: PLC0415
+
+        plot_scanpath(
+            fix_df,
+            img,
+            title,
+            ax=ax,
+            save_path=save_path,
+            color_by_time=color_by_time,
+            arrows=arrows,
+        )
         return fix_df
 
     def _plot_scanpath(self, fix_df: pd.DataFrame, trial_num: int) -> pd.DataFrame:
-        img = self.load_image(trial_num)
+        img = self.load_background(trial_num)
         title = self._get_title_base(trial_num)
         title = "Scanpath of " + title
+        from .draw import plot_scanpath  # noqa: PLC0415
+
         plot_scanpath(fix_df, img, title)
         return fix_df
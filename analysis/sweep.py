@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cohort import Job, cohort_jobs
+from .consts import IDTConsts, SMTConsts
+from .fixations import FixationArray, aggregate_runs
+from .IDT import detect_fixations_reach, dispersion_reach
+from .metrics import fixation_durations
+from .SMT import (
+    LABELS,
+    calc_vel,
+    fixation_runs,
+    gen_sac_cand,
+    label_saccades,
+    sac_cand_arrays,
+)
+from .subject import Subject
+
+
+def _summary(fixations: FixationArray) -> dict:
+    durations = pd.Series(fixation_durations(fixations))
+    return {
+        "n_fixations": len(durations),
+        "mean_duration": durations.mean(),
+        "sd_duration": durations.std(),
+    }
+
+
+def _sweep_idt_trial(df: pd.DataFrame, t_disps: list[float], t_durs: list[float]) -> list[dict]:
+    points = df[["elapsed_time_s", "x", "y"]].values
+    rows = []
+    for t_disp in t_disps:
+        # shared by every duration threshold
+        reach = dispersion_reach(points, t_disp)
+        for t_dur in t_durs:
+            fixations = detect_fixations_reach(points, IDTConsts(t_disp, t_dur), reach)
+            rows.append({"t_disp": t_disp, "t_dur": t_dur, **_summary(fixations)})
+    return rows
+
+
+def _sweep_smt_trial(
+    df: pd.DataFrame,
+    thresholds: list[float],
+    widths: list[float],
+    smt_consts: SMTConsts,
+    velocity: np.ndarray | None = None,
+) -> list[dict]:
+    df = df[["elapsed_time_s", "x", "y"]]
+    points = df.to_numpy(dtype=np.float64)
+    times = points[:, 0]
+    # shared by every threshold and width
+    if velocity is None:
+        velocity = calc_vel(df, smt_consts.DIST_EYE2DISP, smt_consts.USE_ANG_VELO)
+    fixation_code = LABELS.index("fixation")
+    rows = []
+    for threshold in thresholds:
+        # shared by every width
+        sac_cand_info = sac_cand_arrays(velocity, threshold)
+        for width in widths:
+            (sac_cands, _non_saccade), _ = gen_sac_cand(sac_cand_info, velocity, width)
+            # the fixations of `convert_data_into_fixations`, from the label codes
+            is_fix = label_saccades(times, sac_cands) == fixation_code
+            run_starts = fixation_runs(is_fix)
+            fixations = aggregate_runs(points, run_starts)[is_fix[run_starts]]
+            rows.append({"threshold": threshold, "width": width, **_summary(fixations)})
+    return rows
+
+
+def _sweep_job(job: Job, grid: dict, smt_consts: SMTConsts | None = None) -> list[dict]:
+    root, group, trial_num, algo = job
+    base = {"name": root.name.split("_")[1], "group": group, "trial": trial_num, "algorithm": algo}
+    try:
+        subj = Subject(root, lazy=True)
+        df = subj.load_data(trial_num)
+        base["task_id"] = subj.trial_num_to_task_id(trial_num)
+        if algo == "IDT":
+            rows = _sweep_idt_trial(df, grid["t_disp"], grid["t_dur"])
+        else:
+            velocity = subj.calc_velocity(trial_num, smt_consts)
+            rows = _sweep_smt_trial(df, grid["threshold"], grid["width"], smt_consts, velocity)
+    except Exception as e:  # noqa: BLE001
+        keys = list(grid)
+        return [
+            {**base, **dict(zip(keys, values)), "error": f"{type(e).__name__}: {e}"}
+            for values in product(*grid.values())
+        ]
+    return [{**base, **row, "error": None} for row in rows]
+
+
+def _run_sweep(
+    algo: str,
+    grid: dict,
+    results_root: Path,
+    trials: list[int] | None,
+    max_workers: int | None,
+    smt_consts: SMTConsts | None = None,
+) -> pd.DataFrame:
+    jobs = cohort_jobs(results_root, trials, algorithms=(algo,))
+    worker = partial(_sweep_job, grid=grid, smt_consts=smt_consts)
+    if max_workers == 1:
+        results = [worker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(worker, jobs))
+    columns = ["name", "group", "trial", "task_id", "algorithm", *grid]
+    columns += ["n_fixations", "mean_duration", "sd_duration", "error"]
+    sweep_df = pd.DataFrame([row for rows in results for row in rows], columns=columns)
+    return sweep_df
+
+
+def sweep_idt(
+    t_disps: list[float],
+    t_durs: list[float],
+    results_root: Path = Path("./results/subjects"),
+    trials: list[int] | None = None,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Evaluate a grid of IDT thresholds on every trial of a cohort.
+
+    Each trial is loaded once, and the dispersion reaches of a `t_disp` are
+    shared by all the `t_dur` values. Returns one row per trial and parameter
+    set with the number of fixations and their mean/SD duration.
+    """
+    grid = {"t_disp": list(t_disps), "t_dur": list(t_durs)}
+    return _run_sweep("IDT", grid, results_root, trials, max_workers)
+
+
+def sweep_smt(
+    thresholds: list[float],
+    widths: list[float],
+    results_root: Path = Path("./results/subjects"),
+    trials: list[int] | None = None,
+    smt_consts: SMTConsts | None = None,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Evaluate a grid of SMT thresholds and widths on every trial of a cohort.
+
+    The velocity of a trial is computed once (with the geometry of
+    `smt_consts`), and the saccade candidates of a threshold are shared by all
+    the widths. Returns the same table as `sweep_idt`.
+    """
+    grid = {"threshold": list(thresholds), "width": list(widths)}
+    if smt_consts is None:
+        smt_consts = SMTConsts()
+    return _run_sweep("SMT", grid, results_root, trials, max_workers, smt_consts)
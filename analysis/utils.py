@@ -1,34 +1,27 @@
-from datetime import datetime
+from functools import wraps
 
 from .logger_config import logger
-
-TIME_STAMPS = dict()
-TIME_STAMPS["log_ts"] = (0, 0)
+from .profiling import PROFILER
 
 
 def log_ts(func):
     """utility decorator to log runtime
 
+    Every call is recorded as a stage of `profiling.PROFILER`, and calls
+    longer than 0.1 seconds are logged.
+
     Args:
         func : function to run
     """
-    global TIME_STAMPS
+    fn_name = func.__name__
 
+    @wraps(func)
     def wrapper(*args, **kargs):
-        start = datetime.now()
-        ret = func(*args, **kargs)
-        erapsed_time = (datetime.now() - start).total_seconds()
-
-        fn_name = func.__name__
-        t, called = TIME_STAMPS.get(fn_name, (0, 0))
-        TIME_STAMPS[fn_name] = (t + erapsed_time, called + 1)
-
-        if erapsed_time > 0.1:
-            logger.info(f"{fn_name} took {erapsed_time:.2f} seconds")
-        TIME_STAMPS[fn_name] = (
-            t + (datetime.now() - start).total_seconds(),
-            called + 1,
-        )
+        with PROFILER.stage(fn_name) as stage:
+            ret = func(*args, **kargs)
+        elapsed_time = stage.wall_ns / 1e9
+        if elapsed_time > 0.1:
+            logger.info(f"{fn_name} took {elapsed_time:.2f} seconds")
         return ret
 
     return wrapper
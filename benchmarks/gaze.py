@@ -0,0 +1,174 @@
+"""Synthetic gaze recordings in the schema of the raw trial_N.csv files.
+
+A recording is a sequence of fixations joined by saccades, interleaved with
+blinks, invalid samples and off-screen excursions, sampled at any rate.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analysis.consts import PIXELS_PER_DEGREE, SCREEN_HEIGHT, SCREEN_WIDTH
+
+# what the tracker writes for a sample it could not measure
+INVALID_XY = (-SCREEN_WIDTH, -SCREEN_HEIGHT)
+START_TIMESTAMP_US = 230_000_000_000
+
+# fixation durations are log-normal around 250ms
+FIX_MEDIAN_S = 0.25
+FIX_SIGMA = 0.4
+FIX_RANGE_S = (0.08, 1.5)
+# saccade duration from the main sequence, 21ms + 2.2ms per degree
+SAC_BASE_S = 0.021
+SAC_PER_DEG_S = 0.0022
+# blinks drop the gaze below the screen for a few samples around the closure
+BLINK_RANGE_S = (0.1, 0.3)
+BLINK_EDGE_S = 0.02
+INVALID_RANGE_S = (0.01, 0.05)
+OFF_SCREEN_RANGE_S = (0.05, 0.3)
+# random walk of the gaze during a fixation, in pixels after 1s
+DRIFT_PX = 10.0
+
+
+def _min_jerk(n: int) -> np.ndarray:
+    # position profile of a saccade, from 0 to 1
+    tau = np.arange(1, n + 1) / n
+    return 10 * tau**3 - 15 * tau**4 + 6 * tau**5
+
+
+def _on_screen_target(rng: np.random.Generator) -> np.ndarray:
+    return rng.uniform((50, 50), (SCREEN_WIDTH - 50, SCREEN_HEIGHT - 50))
+
+
+def _off_screen_target(rng: np.random.Generator) -> np.ndarray:
+    # just past the right or the bottom edge of the screen
+    if rng.random() < 0.5:
+        return np.array([SCREEN_WIDTH + rng.uniform(5, 200), rng.uniform(0, SCREEN_HEIGHT)])
+    return np.array([rng.uniform(0, SCREEN_WIDTH), SCREEN_HEIGHT + rng.uniform(5, 200)])
+
+
+class _Recording:
+    # samples of the recording, appended event by event
+
+    def __init__(self, rate_hz: float, n_samples: int, noise_px: float, rng) -> None:
+        self.dt = 1 / rate_hz
+        self.n_samples = n_samples
+        self.noise_px = noise_px
+        self.rng = rng
+        self.x = np.empty(n_samples)
+        self.y = np.empty(n_samples)
+        self.valid = np.ones(n_samples, dtype=bool)
+        self.n = 0
+        self.gaze = _on_screen_target(rng)
+
+    @property
+    def full(self) -> bool:
+        return self.n >= self.n_samples
+
+    def _take(self, seconds: float) -> slice:
+        n = max(1, round(seconds / self.dt))
+        lo = self.n
+        self.n = min(lo + n, self.n_samples)
+        return slice(lo, self.n)
+
+    def fixate(self, target: np.ndarray, seconds: float) -> None:
+        # tremor around the target and a slow drift
+        s = self._take(seconds)
+        n = s.stop - s.start
+        drift = np.cumsum(self.rng.normal(0, DRIFT_PX * np.sqrt(self.dt), (n, 2)), axis=0)
+        noise = self.rng.normal(0, self.noise_px, (n, 2))
+        xy = target + drift + noise
+        self.x[s], self.y[s] = xy[:, 0], xy[:, 1]
+        self.gaze = np.asarray(target, dtype=np.float64)
+
+    def saccade(self, target: np.ndarray) -> None:
+        amplitude_deg = np.hypot(*(target - self.gaze)) / PIXELS_PER_DEGREE
+        s = self._take(SAC_BASE_S + SAC_PER_DEG_S * amplitude_deg)
+        profile = _min_jerk(s.stop - s.start)[:, None]
+        xy = self.gaze + profile * (target - self.gaze)
+        self.x[s], self.y[s] = xy[:, 0], xy[:, 1]
+        self.gaze = np.asarray(target, dtype=np.float64)
+
+    def invalid(self, seconds: float) -> None:
+        s = self._take(seconds)
+        self.x[s], self.y[s] = INVALID_XY
+        self.valid[s] = False
+
+    def _below_screen(self, seconds: float) -> None:
+        s = self._take(seconds)
+        self.x[s] = self.gaze[0]
+        self.y[s] = -self.rng.uniform(0, 20, s.stop - s.start)
+
+    def blink(self, seconds: float) -> None:
+        # the lid closing and opening are measured below the screen
+        self._below_screen(BLINK_EDGE_S)
+        self.invalid(seconds - 2 * BLINK_EDGE_S)
+        self._below_screen(BLINK_EDGE_S)
+
+
+def generate_trial(
+    duration_s: float = 20.0,
+    rate_hz: float = 90.0,
+    seed: int = 0,
+    blink_rate: float = 0.3,
+    invalid_rate: float = 0.2,
+    off_screen_rate: float = 0.05,
+    noise_px: float = 5.0,
+    drop_rate: float = 0.01,
+) -> pd.DataFrame:
+    """A raw trial frame, the same as `io.load_data` of a trial_N.csv file.
+
+    The `*_rate` arguments are events per second of recording. `drop_rate` is
+    the fraction of samples the tracker skips, leaving a gap in timestamp_us.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = max(1, round(duration_s * rate_hz))
+    rec = _Recording(rate_hz, n_samples, noise_px, rng)
+
+    # probability of each interruption after a fixation
+    fix_mean_s = FIX_MEDIAN_S * np.exp(FIX_SIGMA**2 / 2)
+    p_blink = blink_rate * fix_mean_s
+    p_invalid = invalid_rate * fix_mean_s
+    p_off = off_screen_rate * fix_mean_s
+
+    while not rec.full:
+        fix_s = np.clip(rng.lognormal(np.log(FIX_MEDIAN_S), FIX_SIGMA), *FIX_RANGE_S)
+        target = _on_screen_target(rng)
+        rec.saccade(target)
+        if rec.full:
+            break
+        rec.fixate(target, fix_s)
+
+        u = rng.random()
+        if u < p_blink:
+            rec.blink(rng.uniform(*BLINK_RANGE_S))
+        elif u < p_blink + p_invalid:
+            rec.invalid(rng.uniform(*INVALID_RANGE_S))
+        elif u < p_blink + p_invalid + p_off:
+            off_target = _off_screen_target(rng)
+            rec.saccade(off_target)
+            rec.fixate(off_target, rng.uniform(*OFF_SCREEN_RANGE_S))
+
+    # constant sampling period with skipped samples
+    step_us = 1e6 / rate_hz
+    steps = 1 + (rng.random(n_samples) < drop_rate)
+    steps[0] = 0
+    timestamp_us = START_TIMESTAMP_US + np.round(np.cumsum(steps) * step_us).astype(np.int64)
+
+    # the trackers record float32 coordinates
+    return pd.DataFrame(
+        {
+            "x": rec.x.astype(np.float32).astype(np.float64),
+            "y": rec.y.astype(np.float32).astype(np.float64),
+            "validity": np.where(rec.valid, "Valid", "Invalid"),
+            "timestamp_us": timestamp_us,
+        },
+        index=pd.RangeIndex(n_samples),
+    )
+
+
+def write_trial(raw_df: pd.DataFrame, path: Path) -> Path:
+    """Write a generated trial as a trial_N.csv file."""
+    raw_df.to_csv(path)
+    return path
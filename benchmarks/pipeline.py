@@ -0,0 +1,297 @@
+"""Throughput, peak memory and scaling of the pipeline stages on synthetic gaze.
+
+Every stage runs on recordings of each --rates x --durations, generated by
+`benchmarks.gaze`. Results can be saved as a baseline and later runs compared
+against it; the comparison reuses the baseline's settings and exits with 1 on
+a regression. Baselines are only comparable on the machine that wrote them.
+
+Usage: python -m benchmarks.pipeline [--rates HZ ...] [--durations S ...]
+       [--stages NAME ...] [--save PATH] [--compare PATH]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analysis import IDT, SMT, io
+from analysis.aoi import get_aoi_index
+from analysis.consts import IDTConsts, SMTConsts
+from analysis.metrics import calculate_metrics
+from analysis.postprocess import calc_window_metrics
+from analysis.preprocess import preprocess, preprocess_fused
+from benchmarks.gaze import generate_trial, write_trial
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# the real trials are 20s at ~90Hz, the targets are 1-2kHz trackers
+DEFAULT_RATES = [90, 1000, 2000]
+DEFAULT_DURATIONS = [20, 120]
+DEFAULT_REPEAT = 5
+# slowdown or memory growth over the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# differences below these are noise
+MIN_DELTA_S = 1e-3
+MIN_DELTA_MIB = 0.5
+
+Inputs = dict
+StageFunc = Callable[[Inputs], object]
+
+# registered stages, in pipeline order
+STAGES: dict[str, StageFunc] = {}
+
+
+def register_stage(name: str) -> Callable[[StageFunc], StageFunc]:
+    def decorator(func: StageFunc) -> StageFunc:
+        STAGES[name] = func
+        return func
+
+    return decorator
+
+
+@register_stage("load_csv")
+def _load_csv(inputs: Inputs):
+    return io.load_data(inputs["csv_path"])
+
+
+@register_stage("load_cached")
+def _load_cached(inputs: Inputs):
+    return io.load_data_cached(inputs["csv_path"])
+
+
+@register_stage("preprocess")
+def _preprocess(inputs: Inputs):
+    return preprocess(inputs["raw_df"])
+
+
+@register_stage("preprocess_fused")
+def _preprocess_fused(inputs: Inputs):
+    return preprocess_fused(inputs["raw_df"])
+
+
+@register_stage("idt_naive")
+def _idt_naive(inputs: Inputs):
+    return IDT.detect_fixations(inputs["points"], IDTConsts(engine="naive"))
+
+
+@register_stage("idt_deque")
+def _idt_deque(inputs: Inputs):
+    return IDT.detect_fixations(inputs["points"], IDTConsts(engine="deque"))
+
+
+@register_stage("idt_reach")
+def _idt_reach(inputs: Inputs):
+    return IDT.detect_fixations(inputs["points"], IDTConsts(engine="reach"))
+
+
+@register_stage("smt")
+def _smt(inputs: Inputs):
+    labelled = SMT.detect_fixations(inputs["et_df"], SMTConsts())
+    return SMT.convert_data_into_fixations(labelled)
+
+
+@register_stage("metrics")
+def _metrics(inputs: Inputs):
+    return calculate_metrics(inputs["fixations"])
+
+
+@register_stage("window_metrics")
+def _window_metrics(inputs: Inputs):
+    return calc_window_metrics(
+        inputs["fixations"], duration=inputs["duration_s"], aoi_index=inputs["aoi_index"]
+    )
+
+
+# the naive I-DT rescans its window at every sample, run it on request only
+DEFAULT_STAGES = [name for name in STAGES if name != "idt_naive"]
+
+
+def prepare(duration_s: float, rate_hz: float, tmp_dir: Path, seed: int = 0) -> Inputs:
+    """The input of every stage for one synthetic recording."""
+    raw_df = generate_trial(duration_s, rate_hz, seed=seed)
+    csv_path = write_trial(raw_df, tmp_dir / f"trial_{rate_hz:g}hz_{duration_s:g}s.csv")
+    et_df, _report = preprocess_fused(raw_df)
+    points = et_df[["elapsed_time_s", "x", "y"]].to_numpy()
+    return {
+        "duration_s": duration_s,
+        "rate_hz": rate_hz,
+        "raw_df": raw_df,
+        "csv_path": csv_path,
+        "et_df": et_df,
+        "points": points,
+        "fixations": IDT.detect_fixations(points, IDTConsts()),
+        "aoi_index": get_aoi_index(),
+    }
+
+
+def measure(func: StageFunc, inputs: Inputs, repeat: int = DEFAULT_REPEAT) -> dict:
+    """Best and median wall time of `repeat` runs, and the peak memory of one more."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(inputs)
+        seconds.append(time.perf_counter() - start)
+
+    # traced separately, tracemalloc slows down allocations
+    tracemalloc.start()
+    try:
+        func(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    n_samples = len(inputs["raw_df"])
+    best = min(seconds)
+    return {
+        "n_samples": n_samples,
+        "best_s": best,
+        "median_s": float(np.median(seconds)),
+        "samples_per_s": n_samples / best if best > 0 else np.inf,
+        "peak_mib": peak / 2**20,
+    }
+
+
+def run_suite(
+    rates: list[float],
+    durations: list[float],
+    stages: list[str],
+    repeat: int = DEFAULT_REPEAT,
+) -> pd.DataFrame:
+    """One row per stage and recording size."""
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Invalid stages: {sorted(unknown)}")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rate_hz in rates:
+            for duration_s in durations:
+                inputs = prepare(duration_s, rate_hz, Path(tmp))
+                for name in stages:
+                    result = measure(STAGES[name], inputs, repeat)
+                    rows.append(
+                        {"stage": name, "rate_hz": rate_hz, "duration_s": duration_s, **result}
+                    )
+                    print(
+                        f"{name:<17} {rate_hz:>6g} Hz {duration_s:>6g} s"
+                        f"  {result['best_s'] * 1000:9.2f} ms"
+                        f"  {result['samples_per_s'] / 1e6:7.2f} M samples/s"
+                        f"  {result['peak_mib']:8.2f} MiB",
+                        flush=True,
+                    )
+    return pd.DataFrame(rows)
+
+
+def scaling(results: pd.DataFrame) -> pd.DataFrame:
+    """Exponent k of time ~ n_samples**k per stage, 1 for a linear stage."""
+    rows = []
+    for name, group in results.groupby("stage", sort=False):
+        n = group["n_samples"].to_numpy(dtype=np.float64)
+        t = group["best_s"].to_numpy(dtype=np.float64)
+        if len(np.unique(n)) < 2:
+            exponent = np.nan
+        else:
+            exponent = np.polyfit(np.log(n), np.log(t), 1)[0]
+        rows.append(
+            {
+                "stage": name,
+                "exponent": exponent,
+                "min_samples_per_s": group["samples_per_s"].min(),
+                "max_peak_bytes_per_sample": (group["peak_mib"] * 2**20 / n).max(),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def compare(
+    results: pd.DataFrame, baseline: pd.DataFrame, tolerance: float = DEFAULT_TOLERANCE
+) -> pd.DataFrame:
+    """Time and memory ratios to the baseline of every row measured in both."""
+    keys = ["stage", "rate_hz", "duration_s"]
+    merged = results.merge(baseline, on=keys, suffixes=("", "_base"))
+    merged["time_ratio"] = merged["best_s"] / merged["best_s_base"]
+    merged["mem_ratio"] = merged["peak_mib"] / merged["peak_mib_base"]
+    slower = (merged["time_ratio"] > 1 + tolerance) & (
+        merged["best_s"] - merged["best_s_base"] > MIN_DELTA_S
+    )
+    bigger = (merged["mem_ratio"] > 1 + tolerance) & (
+        merged["peak_mib"] - merged["peak_mib_base"] > MIN_DELTA_MIB
+    )
+    merged["regression"] = slower | bigger
+    return merged[[*keys, "time_ratio", "mem_ratio", "regression"]]
+
+
+def _machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def save_baseline(path: Path, results: pd.DataFrame, config: dict) -> None:
+    baseline = {
+        "config": config,
+        "machine": _machine(),
+        "results": results.to_dict(orient="records"),
+    }
+    path.write_text(json.dumps(baseline, indent=1) + "\n", encoding="utf-8")
+
+
+def load_baseline(path: Path) -> tuple[pd.DataFrame, dict]:
+    baseline = json.loads(path.read_text(encoding="utf-8"))
+    return pd.DataFrame(baseline["results"]), baseline["config"]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=float, nargs="+", help="sampling rates in Hz")
+    parser.add_argument("--durations", type=float, nargs="+", help="recording lengths in s")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES))
+    parser.add_argument("--repeat", type=int)
+    parser.add_argument("--save", type=Path, nargs="?", const=BASELINE_PATH, help="write a baseline")
+    parser.add_argument("--compare", type=Path, nargs="?", const=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    # a comparison runs what the baseline ran, unless told otherwise
+    baseline, config = None, {}
+    if args.compare is not None:
+        baseline, config = load_baseline(args.compare)
+    config = {
+        "rates": args.rates or config.get("rates", DEFAULT_RATES),
+        "durations": args.durations or config.get("durations", DEFAULT_DURATIONS),
+        "stages": args.stages or config.get("stages", DEFAULT_STAGES),
+        "repeat": args.repeat or config.get("repeat", DEFAULT_REPEAT),
+    }
+
+    results = run_suite(**config)
+    print()
+    print(scaling(results).to_string(index=False, float_format="{:.3g}".format))
+
+    if args.save is not None:
+        save_baseline(args.save, results, config)
+        print(f"\nbaseline written to {args.save}")
+
+    if baseline is not None:
+        report = compare(results, baseline, args.tolerance)
+        print()
+        ratio = "{:.2f}".format
+        print(report.to_string(index=False, formatters={"time_ratio": ratio, "mem_ratio": ratio}))
+        if report["regression"].any():
+            print(f"\n{report['regression'].sum()} regressions over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
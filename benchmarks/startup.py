@@ -0,0 +1,60 @@
+"""Cold import time of the analysis package, each run in a fresh interpreter.
+
+Usage: python benchmarks/startup.py [--runs N]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# modules a headless batch worker needs, and the plotting entry points
+TARGETS = {
+    "compute": "from analysis import IDT, metrics, preprocess",
+    "package": "import analysis",
+    "plotting": "import analysis.draw",
+}
+HEAVY_MODULES = ("matplotlib", "PIL", "seaborn")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement: str) -> dict:
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for name, statement in TARGETS.items():
+        results = [time_import(statement) for _ in range(args.runs)]
+        seconds = [r["seconds"] * 1000 for r in results]
+        print(
+            f"{name:<9} median {statistics.median(seconds):7.1f} ms"
+            f"  min {min(seconds):7.1f} ms"
+            f"  loads {', '.join(results[0]['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
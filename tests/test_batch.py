@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import IDT, SMT
+from analysis.batch import SampleBatch, detect_fixations_idt_batch, detect_fixations_smt_batch
+from analysis.consts import IDTConsts, SMTConsts
+from analysis.io import load_path
+from analysis.preprocess import preprocess_fused
+from analysis.subject import Subject
+from benchmarks.gaze import generate_trial
+
+RESULTS_ROOT = Path(__file__).parent.parent / "results" / "subjects"
+
+
+def _subject_params() -> list:
+    return [pytest.param(root, id=root.name) for root in sum(load_path(RESULTS_ROOT), [])]
+
+
+def _assert_same_fixations(actual, expected) -> None:
+    assert len(actual) == len(expected)
+    for name in expected.columns:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+
+
+@pytest.mark.parametrize("root", _subject_params())
+def test_idt_batch_matches_trials(root: Path) -> None:
+    subj = Subject(root, lazy=True)
+    batch = SampleBatch.from_subjects([subj])
+    ragged = detect_fixations_idt_batch(batch, subj.idt_consts)
+
+    assert ragged.keys == [(root, trial_num) for trial_num in subj.all_trials]
+    for k, trial_num in enumerate(subj.all_trials):
+        expected = IDT.detect_fixations(subj.trial_points(trial_num), subj.idt_consts)
+        _assert_same_fixations(ragged[k], expected)
+
+
+@pytest.mark.parametrize("root", _subject_params())
+def test_smt_batch_matches_trials(root: Path) -> None:
+    subj = Subject(root, lazy=True)
+    batch = SampleBatch.from_subjects([subj])
+    ragged = detect_fixations_smt_batch(batch, subj.smt_consts)
+
+    assert ragged.keys == [(root, trial_num) for trial_num in subj.all_trials]
+    for k, trial_num in enumerate(subj.all_trials):
+        labelled = SMT.detect_fixations(subj.load_data(trial_num), subj.smt_consts)
+        _assert_same_fixations(ragged[k], SMT.convert_data_into_fixations(labelled))
+
+
+def test_batch_cuts_events_at_trial_starts() -> None:
+    # one recording cut into trials in the middle of fixations and saccades,
+    # with times that keep increasing over the cuts
+    et_df, _report = preprocess_fused(generate_trial(30.0, 250.0, seed=1))
+    points = et_df[["elapsed_time_s", "x", "y"]].to_numpy()
+    bounds = np.linspace(0, len(points), 24).astype(np.int64)
+    trials = [points[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+    batch = SampleBatch.concat(trials, keys=list(range(len(trials))))
+
+    idt_consts = IDTConsts()
+    smt_consts = SMTConsts()
+    idt = detect_fixations_idt_batch(batch, idt_consts)
+    smt = detect_fixations_smt_batch(batch, smt_consts)
+    for k, trial_points in enumerate(trials):
+        _assert_same_fixations(idt[k], IDT.detect_fixations(trial_points, idt_consts))
+        trial_df = pd.DataFrame(trial_points, columns=["elapsed_time_s", "x", "y"])
+        labelled = SMT.detect_fixations(trial_df, smt_consts)
+        _assert_same_fixations(smt[k], SMT.convert_data_into_fixations(labelled))
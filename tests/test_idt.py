@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from analysis import IDT
+from analysis.consts import IDTConsts
+from analysis.io import load_path
+from analysis.subject import Subject
+
+RESULTS_ROOT = Path(__file__).parent.parent / "results" / "subjects"
+TRIALS = range(5)
+
+
+def _trial_params() -> list:
+    params = []
+    for root in sum(load_path(RESULTS_ROOT), []):
+        for trial_num in TRIALS:
+            params.append(pytest.param(root, trial_num, id=f"{root.name}-trial{trial_num}"))
+    return params
+
+
+@pytest.fixture(scope="module")
+def subjects() -> dict[Path, Subject]:
+    return {}
+
+
+def _points(subjects: dict[Path, Subject], root: Path, trial_num: int) -> np.ndarray:
+    # one Subject per root, shared by all its trials and engines
+    if root not in subjects:
+        subjects[root] = Subject(root)
+    df = subjects[root].load_data(trial_num)
+    return df[["elapsed_time_s", "x", "y"]].to_numpy()
+
+
+@pytest.mark.parametrize("engine", ["deque", "reach"])
+@pytest.mark.parametrize(("root", "trial_num"), _trial_params())
+def test_engine_matches_naive(subjects, root: Path, trial_num: int, engine: str) -> None:
+    points = _points(subjects, root, trial_num)
+
+    expected = IDT.detect_fixations(points, IDTConsts(engine="naive"))
+    actual = IDT.detect_fixations(points, IDTConsts(engine=engine))
+
+    assert len(actual) == len(expected)
+    for name in expected.columns:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
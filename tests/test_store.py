@@ -0,0 +1,100 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from analysis.consts import IDTConsts, SMTConsts
+from analysis.fixations import FIXATION_DTYPE, FixationArray
+from analysis.store import ResultStore
+
+
+def _fixations(n: int, seed: int = 0) -> FixationArray:
+    rng = np.random.default_rng(seed)
+    data = np.zeros(n, dtype=FIXATION_DTYPE)
+    for name in FIXATION_DTYPE.names:
+        data[name] = rng.uniform(0, 100, n)
+    return FixationArray(data)
+
+
+def _entry_path(store: ResultStore, key: str) -> Path:
+    return next(store.root.glob(f"*/{key}.npy"))
+
+
+def _entry_size(n: int, tmp_path: Path) -> int:
+    path = tmp_path / "entry.npy"
+    np.save(path, _fixations(n).data)
+    return path.stat().st_size
+
+
+def test_put_get_round_trip(tmp_path: Path) -> None:
+    store = ResultStore(tmp_path / "store")
+    fixations = _fixations(50)
+
+    assert store.get("ab" * 32) is None
+    store.put("ab" * 32, fixations)
+    loaded = store.get("ab" * 32)
+
+    assert loaded.data.dtype == FIXATION_DTYPE
+    np.testing.assert_array_equal(loaded.data, fixations.data)
+
+
+def test_put_frame(tmp_path: Path) -> None:
+    store = ResultStore(tmp_path / "store")
+    fixations = _fixations(10)
+
+    store.put("cd" * 32, fixations.to_frame())
+
+    loaded = store.get("cd" * 32)
+    for name in fixations.to_frame().columns:
+        np.testing.assert_array_equal(loaded[name], fixations[name], err_msg=name)
+
+
+def test_key_changes_with_inputs(tmp_path: Path) -> None:
+    store = ResultStore(tmp_path / "store")
+    csv_path = tmp_path / "trial_1.csv"
+    csv_path.write_text(",x,y,validity,timestamp_us\n0,1.0,2.0,Valid,10\n", encoding="utf-8")
+
+    key = store.key(csv_path, "IDT", IDTConsts())
+    assert store.key(csv_path, "IDT", IDTConsts()) == key
+    assert store.key(csv_path, "IDT", IDTConsts(t_disp=40)) != key
+    assert store.key(csv_path, "IDT", IDTConsts(t_dur=0.2)) != key
+    assert store.key(csv_path, "SMT", SMTConsts()) != key
+
+    csv_path.write_text(",x,y,validity,timestamp_us\n0,1.0,3.0,Valid,10\n", encoding="utf-8")
+    assert store.key(csv_path, "IDT", IDTConsts()) != key
+
+
+def test_put_stays_under_max_bytes(tmp_path: Path) -> None:
+    n_kept = 3
+    entry_size = _entry_size(100, tmp_path)
+    store = ResultStore(tmp_path / "store", max_bytes=n_kept * entry_size)
+
+    keys = [f"{i:02x}" * 32 for i in range(8)]
+    for i, key in enumerate(keys):
+        store.put(key, _fixations(100, seed=i))
+        assert store.stats()["nbytes"] <= store.max_bytes
+
+    stats = store.stats()
+    assert stats["entries"] == n_kept
+    # the last written entries are kept
+    assert all(store.get(key) is not None for key in keys[-n_kept:])
+
+
+def test_prune_evicts_least_recently_used(tmp_path: Path) -> None:
+    store = ResultStore(tmp_path / "store")
+    keys = [f"{i:02x}" * 32 for i in range(4)]
+    for i, key in enumerate(keys):
+        store.put(key, _fixations(100, seed=i))
+        # distinct use times, oldest first
+        os.utime(_entry_path(store, key), ns=(i * 10**9, i * 10**9))
+    store.get(keys[0])
+    entry_size = _entry_path(store, keys[0]).stat().st_size
+
+    n_evicted = store.prune(2 * entry_size)
+
+    assert n_evicted == len(keys) - 2
+    assert store.stats()["nbytes"] <= 2 * entry_size
+    assert store.get(keys[0]) is not None
+    assert store.get(keys[3]) is not None
+    assert store.get(keys[1]) is None
+    assert store.get(keys[2]) is None
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from analysis import IDT, SMT
+from analysis.fixations import FIXATION_COLUMNS
+from analysis.io import load_path
+from analysis.stream import (
+    StreamingIDT,
+    StreamingSMT,
+    fixations_to_frame,
+    replay_trial,
+    run_stream,
+)
+from analysis.subject import Subject
+
+RESULTS_ROOT = Path(__file__).parent.parent / "results" / "subjects"
+TRIALS = range(5)
+CHUNK_SIZES = [7, 256]
+
+
+def _trial_params() -> list:
+    params = []
+    for root in sum(load_path(RESULTS_ROOT), []):
+        for trial_num in TRIALS:
+            params.append(pytest.param(root, trial_num, id=f"{root.name}-trial{trial_num}"))
+    return params
+
+
+@pytest.fixture(scope="module")
+def subjects() -> dict[Path, Subject]:
+    return {}
+
+
+def _subject(subjects: dict[Path, Subject], root: Path) -> Subject:
+    if root not in subjects:
+        subjects[root] = Subject(root, lazy=True)
+    return subjects[root]
+
+
+def _assert_same_fixations(actual, expected) -> None:
+    # the events carry no AOI label
+    assert len(actual) == len(expected)
+    for name in FIXATION_COLUMNS:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(("root", "trial_num"), _trial_params())
+def test_idt_stream_matches_batch(subjects, root: Path, trial_num: int, chunk_size: int) -> None:
+    subj = _subject(subjects, root)
+    expected = IDT.detect_fixations(subj.trial_points(trial_num), subj.idt_consts)
+
+    chunks = replay_trial(subj.trial_path(trial_num), chunk_size, speed=None)
+    events, _report = run_stream(StreamingIDT(subj.idt_consts), chunks)
+
+    _assert_same_fixations(fixations_to_frame(events), expected)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize(("root", "trial_num"), _trial_params())
+def test_smt_stream_matches_batch(subjects, root: Path, trial_num: int, chunk_size: int) -> None:
+    subj = _subject(subjects, root)
+    labelled = SMT.detect_fixations(subj.load_data(trial_num), subj.smt_consts)
+    expected = SMT.convert_data_into_fixations(labelled)
+
+    chunks = replay_trial(subj.trial_path(trial_num), chunk_size, speed=None)
+    events, _report = run_stream(StreamingSMT(subj.smt_consts), chunks)
+
+    _assert_same_fixations(fixations_to_frame(events), expected)